@@ -1,46 +1,163 @@
-from flask import Flask, request, jsonify, Response
-from utils.db_connector import DBManagement
+from flask import Flask, request, Response, stream_with_context
+from utils.db_connector import PoolTimeoutError
 import json
-from typing import List
-from utils.manage_response import *
+import os
+from typing import Dict, List, Optional, Tuple
+from utils.manage_response import (RESPONSE_MODES, search_facilities, search_locations, search_batch_chunk, search_nearest,
+                                   search_viewport, calculate_scores, cache_stats, single_flight_stats, stale_stats)
+from utils.spatial_engine import get_spatial_engine
+from utils import config, metrics
+from utils.facilities import parse_facilities_type
+from utils.score_weights import current_score_weights
+from utils.admission import OverloadedError, request_deadline
+from utils.rds_query import admission_stats, breaker_stats, pool_stats, pool_endpoint_stats, DB_UNAVAILABLE_ERRORS, UnifiedTableMissingError
+from utils.heatmap import current_heatmap
+from utils.clustering import cluster_facility_body, cluster_places
+from utils.encoding import dumps_json, encode_response, negotiate_format
+from utils.http_cache import cacheable
 
 
 app = Flask(__name__)
 
+# /metrics에 같이 내보낼 gauge
+metrics.register_gauge('mappy_db_pool', pool_stats)
+## hit_rate는 worker 간에 더할 수 없으므로 제외 (hits / misses로 계산)
+metrics.register_gauge('mappy_response_cache', lambda: {stat: value for stat, value in cache_stats().items() if stat != 'hit_rate'})
+metrics.register_gauge('mappy_single_flight', single_flight_stats)
+metrics.register_gauge('mappy_admission', admission_stats)
+## state: 0 closed, 1 half_open, 2 open (worker 합산이므로 0보다 크면 open인 worker가 있음)
+metrics.register_gauge('mappy_circuit_breaker', breaker_stats)
+metrics.register_gauge('mappy_stale_cache', stale_stats)
+
+# memory backend는 uWSGI fork 전에 미리 load해서 worker들이 공유하도록 함
+if config.SERVING_BACKEND == 'memory':
+    get_spatial_engine()
+
+
+# 응답 형태 query parameter (mode=full|count|top_k, k=업종별 장소 개수)
+def parse_response_mode(args) -> Tuple[str, int]:
+    mode = args.get('mode', 'full')
+    k = args.get('k', type=int)
+
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"mode는 {', '.join(RESPONSE_MODES)} 중 하나여야 합니다.")
+    if mode == 'top_k' and (k is None or not 1 <= k <= config.TOP_K_MAX):
+        raise ValueError(f"mode=top_k 에는 1 이상 {config.TOP_K_MAX} 이하의 k가 필요합니다.")
+
+    return mode, k
+
+# 장소 대신 cluster로 응답할 zoom level (없으면 None) - 전체 장소가 있는 mode=full 에서만 가능
+def parse_cluster_zoom(args, mode: str = 'full') -> Optional[int]:
+    zoom = args.get('cluster_zoom')
+    if zoom is None:
+        return None
+
+    try:
+        zoom = int(zoom)
+    except ValueError:
+        raise ValueError('cluster_zoom은 정수여야 합니다.')
+    if not 0 <= zoom <= config.CLUSTER_MAX_ZOOM:
+        raise ValueError(f'cluster_zoom은 0 이상 {config.CLUSTER_MAX_ZOOM} 이하여야 합니다.')
+    if mode != 'full':
+        raise ValueError('cluster_zoom은 mode=full 에서만 사용할 수 있습니다.')
+
+    return zoom
+
+# /nearest의 k (k=3 이면 모든 업종 3개, k=metro:1,pharmacy:3 이면 업종별, 없는 업종은 1개)
+def parse_nearest_k(facilities_type: List[str], value: str) -> Dict[str, int]:
+    def parse_k(k: str) -> int:
+        try:
+            k = int(k)
+        except ValueError:
+            raise ValueError("k는 정수 또는 '업종:개수,...' 형식이어야 합니다.")
+        if not 1 <= k <= config.TOP_K_MAX:
+            raise ValueError(f"k는 1 이상 {config.TOP_K_MAX} 이하여야 합니다.")
+        return k
+
+    if value is None or ':' not in value:
+        k = 1 if value is None else parse_k(value)
+        return {facility: k for facility in facilities_type}
+
+    k_by_facility = {facility: 1 for facility in facilities_type}
+    for item in value.split(','):
+        facility, _, k = item.partition(':')
+        if facility.strip() not in k_by_facility:
+            raise ValueError(f"k의 {facility.strip()}는 facilities_type에 없습니다.")
+        k_by_facility[facility.strip()] = parse_k(k)
+
+    return k_by_facility
+
+def bad_request(message: str) -> Response:
+    response_dict = {'status': 400, 'message': message}
+    return Response(json.dumps(response_dict), mimetype='application/json', status=400)
+
+# DB가 밀려 있으면 대기열을 늘리지 않고 바로 503 (client는 Retry-After 후 재시도)
+@app.errorhandler(OverloadedError)
+@app.errorhandler(PoolTimeoutError)
+def service_unavailable(error: Exception) -> Response:
+    response_dict = {'status': 503, 'message': str(error)}
+    return Response(json.dumps(response_dict), mimetype='application/json', status=503, headers={'Retry-After': '1'})
+
+# /viewport가 사용하는 통합 table이 없으면 재시도해도 소용없으므로 Retry-After 없이 503
+@app.errorhandler(UnifiedTableMissingError)
+def unified_table_missing(error: Exception) -> Response:
+    response_dict = {'status': 503, 'message': str(error)}
+    return Response(json.dumps(response_dict), mimetype='application/json', status=503)
 
 @app.route('/')
 def index():
     return "Hello Flask"
 
 @app.route('/db_check', methods=['GET'])
+@cacheable
 def db_check():
     if request.method == 'GET':
 
 
         # requested data from web server
-        facilities_type = request.args.get('facilities_type').split(',')
         lat             = float(request.args.get('lat'))
         lon             = float(request.args.get('lon'))
         radius_meter    = int(request.args.get('radius'))
+        try:
+            facilities_type = parse_facilities_type(request.args.get('facilities_type'))
+            mode, k     = parse_response_mode(request.args)
+            cluster_zoom = parse_cluster_zoom(request.args, mode)
+            response_format = negotiate_format(request)
+        except ValueError as e:
+            return bad_request(str(e))
         
-        # request to rds
-        response_list = request_to_rds(facilities_type, lat, lon, radius_meter)
+        with metrics.request_context('db_check', facilities_type), request_deadline():
+            # request to rds
+            response_list = search_facilities(facilities_type, lat, lon, radius_meter, mode, k)
 
-        total_count   = response_list[0]
-        facility_body = response_list[1]
-        hashtag_list  = response_list[2]
+            total_count   = response_list[0]
+            facility_body = response_list[1]
+            hashtag_list  = response_list[2]
 
-        # response to web_server
-        response_dict = {
-                        'status'  : 200,
-                        'location': {
-                                    'total_count' : total_count,
-                                    'facility_type' : facility_body,
-                                    'hashtag': hashtag_list
-                                    }
-                        }
+            # 장소 목록 대신 cluster (개수가 많을 때 직렬화/전송량 감소)
+            if cluster_zoom is not None:
+                with metrics.timer('cluster'):
+                    facility_body = cluster_facility_body(facility_body, cluster_zoom)
+
+            # response to web_server
+            response_dict = {
+                            'status'  : 200,
+                            'location': {
+                                        'total_count' : total_count,
+                                        'facility_type' : facility_body,
+                                        'hashtag': hashtag_list
+                                        }
+                            }
+            # DB 장애로 마지막 정상 결과를 대신 보내는 경우
+            if getattr(response_list, 'stale', False):
+                response_dict['stale'] = True
 
-        response = Response(json.dumps(response_dict), mimetype='application/json', status=200)
+            with metrics.timer('serialize'):
+                response = encode_response(response_dict, response_format)
+
+            # stale 응답은 nginx/browser에 cache되지 않도록 함
+            if response_dict.get('stale'):
+                response.headers['Cache-Control'] = 'no-store'
         
         return response
 
@@ -48,10 +165,10 @@ def db_check():
         return 'Not GET request', 404
 
 @app.route('/db_check_two')
+@cacheable
 def db_check_two():
     if request.method == 'GET':
         
-        facilities_type = request.args.get('facilities_type').split(',')
         radius_meter = int(request.args.get('radius'))
 
         #location 1
@@ -61,48 +178,72 @@ def db_check_two():
         lat_2 = float(request.args.get('lat_2'))
         lon_2 = float(request.args.get('lon_2'))
 
-        # response for location 1
-        response_list_1 = request_to_rds(facilities_type, lat_1, lon_1, radius_meter)
-        total_count_1, facility_body_1, hashtag_list_1  = response_list_1[0], response_list_1[1], response_list_1[2]
+        try:
+            facilities_type = parse_facilities_type(request.args.get('facilities_type'))
+            mode, k = parse_response_mode(request.args)
+            cluster_zoom = parse_cluster_zoom(request.args, mode)
+            response_format = negotiate_format(request)
+        except ValueError as e:
+            return bad_request(str(e))
+
+        with metrics.request_context('db_check_two', facilities_type), request_deadline():
+            # response for location 1, 2 (동시에 검색)
+            response_list_1, response_list_2 = search_locations(facilities_type, [(lat_1, lon_1), (lat_2, lon_2)], radius_meter, mode, k)
+            total_count_1, facility_body_1, hashtag_list_1  = response_list_1[0], response_list_1[1], response_list_1[2]
+            total_count_2, facility_body_2, hashtag_list_2  = response_list_2[0], response_list_2[1], response_list_2[2]
 
-        # response for location 2
-        response_list_2 = request_to_rds(facilities_type, lat_2, lon_2, radius_meter)
-        total_count_2, facility_body_2, hashtag_list_2  = response_list_2[0], response_list_2[1], response_list_2[2]
+            # scoring (두 위치를 한번에 계산)
+            with metrics.timer('score'):
+                score_list = calculate_scores(facilities_type, [(total_count_1, facility_body_1), (total_count_2, facility_body_2)])
+            individual_score_1, total_score_1 = score_list[0]
+            individual_score_2, total_score_2 = score_list[1]
 
-        # scoring
-        individual_score_1, total_score_1 = calculate_score(facilities_type, total_count_1, facility_body_1)
-        individual_score_2, total_score_2 = calculate_score(facilities_type, total_count_2, facility_body_2)
+            # score 계산 후 장소 목록을 cluster로 교체
+            if cluster_zoom is not None:
+                with metrics.timer('cluster'):
+                    facility_body_1 = cluster_facility_body(facility_body_1, cluster_zoom)
+                    facility_body_2 = cluster_facility_body(facility_body_2, cluster_zoom)
 
         
-        # response to web server
-        response_dict = {
-                        'status'  : 200,
-                        'location_1': {
-                                    'total_count' : total_count_1,
-                                    'facility_type' : facility_body_1,
-                                    'hashtag': hashtag_list_1,
-                                    'score' : {
-                                            "total_score": total_score_1,
-                                            "individual_score": individual_score_1
-                                               }
-                                    },
-                        'location_2': {
-                                    'total_count' : total_count_2,
-                                    'facility_type' : facility_body_2,
-                                    'hashtag': hashtag_list_2,
-                                    'score' : {
-                                            "total_score": total_score_2,
-                                            "individual_score": individual_score_2
-                                               }
-                                    },
-                        }
+            # response to web server
+            response_dict = {
+                            'status'  : 200,
+                            'location_1': {
+                                        'total_count' : total_count_1,
+                                        'facility_type' : facility_body_1,
+                                        'hashtag': hashtag_list_1,
+                                        'score' : {
+                                                "total_score": total_score_1,
+                                                "individual_score": individual_score_1
+                                                   }
+                                        },
+                            'location_2': {
+                                        'total_count' : total_count_2,
+                                        'facility_type' : facility_body_2,
+                                        'hashtag': hashtag_list_2,
+                                        'score' : {
+                                                "total_score": total_score_2,
+                                                "individual_score": individual_score_2
+                                                   }
+                                        },
+                            }
 
-        categories = list(individual_score_1.keys())
-        values1 = list(individual_score_1.values())
-        values2 = list(individual_score_2.values())
+            # DB 장애로 마지막 정상 결과를 대신 보내는 경우
+            for location_key, response_list in (('location_1', response_list_1), ('location_2', response_list_2)):
+                if getattr(response_list, 'stale', False):
+                    response_dict[location_key]['stale'] = True
 
+            categories = list(individual_score_1.keys())
+            values1 = list(individual_score_1.values())
+            values2 = list(individual_score_2.values())
 
-        response = Response(json.dumps(response_dict), mimetype='application/json', status=200)
+
+            with metrics.timer('serialize'):
+                response = encode_response(response_dict, response_format)
+
+            # stale 응답은 nginx/browser에 cache되지 않도록 함
+            if any(response_dict[location_key].get('stale') for location_key in ('location_1', 'location_2')):
+                response.headers['Cache-Control'] = 'no-store'
         return response
 
         
@@ -110,6 +251,215 @@ def db_check_two():
     else:
         return 'Not Get request', 404
 
+@app.route('/db_check_batch', methods=['POST'])
+def db_check_batch():
+    # body: {"facilities_type": "bus,cafe" 또는 ["bus", "cafe"], "radius": 500, "points": [[lat, lon], ...]}
+    body = request.get_json(silent=True) or {}
+
+    try:
+        radius_meter = int(body['radius'])
+        points = [(float(point[0]), float(point[1])) for point in body['points']]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return bad_request('facilities_type, radius, points([[lat, lon], ...])가 필요합니다.')
+
+    if not points or len(points) > config.BATCH_MAX_POINTS:
+        return bad_request(f'points는 1개 이상 {config.BATCH_MAX_POINTS}개 이하만 가능합니다.')
+
+    try:
+        facilities_type = parse_facilities_type(body.get('facilities_type'))
+        mode, k = parse_response_mode(request.args)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    # chunk 단위로 검색이 끝나는 대로 한 줄(위치 하나)씩 전송 (NDJSON)
+    ## 200 응답을 이미 보내기 시작했으므로, 실패한 chunk는 위치마다 status/message가 있는 줄로 알리고 다음 chunk를 계속 검색
+    def generate():
+        with metrics.request_context('db_check_batch', facilities_type):
+            for start in range(0, len(points), config.BATCH_QUERY_CHUNK):
+                chunk_points = points[start:start + config.BATCH_QUERY_CHUNK]
+                try:
+                    response_lists = search_batch_chunk(facilities_type, chunk_points, radius_meter, mode, k)
+                    with metrics.timer('score'):
+                        score_list = calculate_scores(facilities_type, [(response_list[0], response_list[1]) for response_list in response_lists])
+                except DB_UNAVAILABLE_ERRORS as e:
+                    for index, (lat, lon) in enumerate(chunk_points, start):
+                        yield dumps_json({'index': index, 'lat': lat, 'lon': lon, 'status': 503, 'message': str(e)}) + b'\n'
+                    continue
+                except Exception as e:
+                    print(f"db_check_batch 검색 실패: {e!r}")
+                    for index, (lat, lon) in enumerate(chunk_points, start):
+                        yield dumps_json({'index': index, 'lat': lat, 'lon': lon, 'status': 500, 'message': '검색 중 오류가 발생했습니다.'}) + b'\n'
+                    continue
+
+                for index, ((lat, lon), response_list, (individual_score, total_score)) in enumerate(zip(chunk_points, response_lists, score_list), start):
+                    location_dict = {
+                                    'index': index,
+                                    'lat': lat,
+                                    'lon': lon,
+                                    'total_count' : response_list[0],
+                                    'facility_type' : response_list[1],
+                                    'hashtag': response_list[2],
+                                    'score' : {
+                                            "total_score": total_score,
+                                            "individual_score": individual_score
+                                            }
+                                    }
+                    yield dumps_json(location_dict) + b'\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson', status=200)
+    # nginx가 응답을 모아서 보내지 않도록 buffering 해제
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/nearest')
+@cacheable
+def nearest():
+    # 반경과 관계없이 업종별 가까운 k개 (거리순)
+    try:
+        lat = float(request.args.get('lat'))
+        lon = float(request.args.get('lon'))
+    except (TypeError, ValueError):
+        return bad_request('lat, lon이 필요합니다.')
+
+    try:
+        facilities_type = parse_facilities_type(request.args.get('facilities_type'))
+        k_by_facility = parse_nearest_k(facilities_type, request.args.get('k'))
+    except ValueError as e:
+        return bad_request(str(e))
+
+    with metrics.request_context('nearest', facilities_type), request_deadline():
+        facility_body = search_nearest(k_by_facility, lat, lon)
+
+        response_dict = {
+                        'status': 200,
+                        'location': {
+                                    'facility_type': facility_body
+                                    }
+                        }
+
+        with metrics.timer('serialize'):
+            response = Response(json.dumps(response_dict), mimetype='application/json', status=200)
+
+    return response
+
+@app.route('/viewport')
+@cacheable
+def viewport():
+    # 지도 화면 사각형 안의 시설 (cursor로 다음 page 요청)
+    try:
+        box = tuple(float(request.args.get(name)) for name in ('min_lat', 'min_lon', 'max_lat', 'max_lon'))
+    except (TypeError, ValueError):
+        return bad_request('min_lat, min_lon, max_lat, max_lon이 필요합니다.')
+    if box[0] > box[2] or box[1] > box[3]:
+        return bad_request('min_lat <= max_lat, min_lon <= max_lon 이어야 합니다.')
+
+    limit = request.args.get('limit', config.VIEWPORT_PAGE_SIZE, type=int)
+    if not 1 <= limit <= config.VIEWPORT_PAGE_MAX:
+        return bad_request(f'limit은 1 이상 {config.VIEWPORT_PAGE_MAX} 이하여야 합니다.')
+
+    try:
+        facilities_type = parse_facilities_type(request.args.get('facilities_type'))
+        cluster_zoom = parse_cluster_zoom(request.args)
+        with metrics.request_context('viewport', facilities_type), request_deadline():
+            if cluster_zoom is None:
+                places, next_cursor = search_viewport(facilities_type, box, request.args.get('cursor'), limit)
+
+                response_dict = {
+                                'status': 200,
+                                'count': len(places),
+                                'place': places,
+                                'next_cursor': next_cursor
+                                }
+            else:
+                # cluster는 page 없이 사각형 안 전체(VIEWPORT_CLUSTER_MAX 개까지)를 묶음
+                places, next_cursor = search_viewport(facilities_type, box, None, config.VIEWPORT_CLUSTER_MAX)
+                with metrics.timer('cluster'):
+                    facility_body = cluster_places(facilities_type, places, cluster_zoom)
+
+                response_dict = {
+                                'status': 200,
+                                'count': len(places),
+                                'facility_type': facility_body,
+                                'truncated': next_cursor is not None
+                                }
+
+            with metrics.timer('serialize'):
+                response = Response(json.dumps(response_dict), mimetype='application/json', status=200)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    return response
+
+# 데이터는 갱신 script가 돌 때만 바뀌므로 browser/nginx에서 HEATMAP_CACHE_SECONDS 동안 cache
+@app.route('/heatmap/<int:z>/<int:x>/<int:y>')
+@cacheable(max_age=config.HEATMAP_CACHE_SECONDS)
+def heatmap_tile(z: int, x: int, y: int):
+    # 미리 계산한 sub-cell별 업종 개수로 tile 하나의 score (grid x grid, 북쪽 행부터)
+    try:
+        facilities_type = parse_facilities_type(request.args.get('facilities_type'))
+    except ValueError as e:
+        return bad_request(str(e))
+
+    heatmap = current_heatmap()
+    with metrics.request_context('heatmap', facilities_type):
+        total_score = heatmap.tile_scores(z, x, y, facilities_type) if heatmap is not None else None
+        if total_score is None:
+            response_dict = {'status': 404, 'message': f'zoom {z} heatmap이 없습니다.'}
+            return Response(json.dumps(response_dict), mimetype='application/json', status=404)
+
+        response_dict = {
+                        'status': 200,
+                        'tile': {'z': z, 'x': x, 'y': y},
+                        'grid': heatmap.grid,
+                        'radius': heatmap.radius,
+                        'total_score': total_score.tolist()
+                        }
+
+        with metrics.timer('serialize'):
+            response = Response(json.dumps(response_dict), mimetype='application/json', status=200)
+
+    return response
+
+@app.route('/pool_stats')
+def db_pool_stats():
+    # worker별 connection pool 상태 (RDS max_connections 대비 크기 조정용)
+    response_dict = {
+                    'status': 200,
+                    'pid': os.getpid(),
+                    'pool': pool_stats(),
+                    'endpoints': pool_endpoint_stats()
+                    }
+
+    return Response(json.dumps(response_dict), mimetype='application/json', status=200)
+
+@app.route('/cache_stats')
+def response_cache_stats():
+    # worker별 response cache hit/miss 통계
+    response_dict = {
+                    'status': 200,
+                    'pid': os.getpid(),
+                    'cache': cache_stats(),
+                    'single_flight': single_flight_stats()
+                    }
+
+    return Response(json.dumps(response_dict), mimetype='application/json', status=200)
+
+@app.route('/score_weights')
+def score_weights():
+    # worker가 현재 사용 중인 score 가중치 snapshot (version으로 갱신 반영 여부 확인)
+    response_dict = {
+                    'status': 200,
+                    'pid': os.getpid(),
+                    'score_weights': current_score_weights().to_dict()
+                    }
+
+    return Response(json.dumps(response_dict), mimetype='application/json', status=200)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # 단계별 소요시간 histogram + pool/cache 상태 (Prometheus text format)
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4', status=200)
+
 if __name__ == "__main__":
     app.run(debug=True)
 
@@ -0,0 +1,192 @@
+"""
+- Benchmark hashtag / score 계산
+- legacy : 업종별 pandas DataFrame + str.contains, pd.Series로 score 계산 (이전 utils.manage_response 구현 그대로)
+- current: utils.manage_response (row를 묶으면서 키워드 확인, 미리 계산한 가중치 배율로 score 계산)
+- DB 없이 임의의 검색 결과 row로 결과가 같은지 확인하고 위치 하나당 소요시간 비교
+"""
+
+import sys
+import os
+import warnings
+warnings.filterwarnings(action='ignore')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import random
+import statistics
+import time
+from contextlib import redirect_stdout
+from typing import List, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.facilities import FACILITY_TYPES, HASHTAG_KEYWORDS
+from utils.manage_response import make_response_list, calculate_score
+from utils.score_weights import current_score_weights
+
+
+# 이전 구현 (비교 기준)
+def legacy_initialize_dataframe(data_dict: dict, key: str) -> pd.DataFrame:
+    try:
+        dataframe = pd.DataFrame(data_dict[key]['place'])
+    except:
+        dataframe = pd.DataFrame()
+
+    return dataframe
+
+def legacy_find_hashtag(location_dict: dict) -> List[str]:
+    hashtag_list = []
+
+    dataframes = {}
+    categories = ['hospital', 'pharmacy', 'laundry', 'hair', 'gym', 'mart', 'convenience', 'cafe', 'bus', 'metro']
+
+    for category in categories:
+        dataframes[category] = legacy_initialize_dataframe(location_dict, category)
+
+    if not dataframes['gym'].empty and dataframes['gym']['name'].str.contains(HASHTAG_KEYWORDS['gym'], regex=True).any():
+        hashtag_list.append("#헬스장")
+    if not dataframes['laundry'].empty and dataframes['laundry']['name'].str.contains(HASHTAG_KEYWORDS['laundry'], regex=True).any():
+        hashtag_list.append("#코인빨래방")
+    if len(dataframes['mart']) >= 1:
+        hashtag_list.append("#마트/쇼핑몰")
+    if len(dataframes['convenience']) >= 3:
+        hashtag_list.append("#편세권")
+    if not dataframes['cafe'].empty and dataframes['cafe']['name'].str.contains(HASHTAG_KEYWORDS['cafe'], regex=True).any():
+        hashtag_list.append("#스세권")
+    if len(dataframes['metro']) >= 3:
+        hashtag_list.append("#초역세권")
+    elif len(dataframes['metro']) >= 1:
+        hashtag_list.append('#역세권')
+
+    return hashtag_list
+
+def legacy_calculate_score(facilities_type: List[str], total_count: int, facility_body: Dict) -> Tuple[Dict, float]:
+    weight = current_score_weights().weights
+
+    if 'metro' in facilities_type:
+        facilities_type.remove('metro')
+
+    weight_series = pd.Series(weight)
+    cnt_series = pd.Series( {type: facility_body[type]['count'] for type in facilities_type} )
+    print('count')
+    print(cnt_series)
+
+    rate_series = (cnt_series / total_count * 100) * 0.3
+    print('비율')
+    print(rate_series)
+
+    weighted_cnt_series = (cnt_series * ( sum(weight_series) / weight_series[facilities_type] )) * 0.7
+    weighted_cnt_series = weighted_cnt_series.apply(lambda x: np.log(x) / np.log(2) if x > 1 else 0)
+    print('가중치')
+    print(weighted_cnt_series)
+
+    individual_score = dict(round(rate_series + weighted_cnt_series, 1))
+    total_score = round(sum(individual_score.values()) / len(facilities_type), 1)
+    print('total')
+    print(individual_score)
+    print('-'* 30)
+
+    return individual_score, total_score
+
+def legacy_make_response_list(facilities_type: List[str], query_result: List[Tuple]) -> List:
+    facility_body = {facility : {"count": 0, "place": []} for facility in facilities_type}
+
+    for row in query_result:
+        kind = row[1]
+        facility_body[kind]['place'].append(
+                                            {'name': row[0],
+                                            'distance':int(row[2]),
+                                            'address': row[3],
+                                            'lat': row[4],
+                                            'lon': row[5]
+                                            })
+        facility_body[kind]['count'] += 1
+
+    return [len(query_result), facility_body, legacy_find_hashtag(facility_body)]
+
+
+# 임의의 검색 결과 row (name, kind, distance, address, lat, lon) - 거리순
+SAMPLE_NAMES = {
+            'gym': ['OO 피트니스', '동네 체육관', 'PT 스튜디오', '요가원'],
+            'laundry': ['크린토피아 OO점', '세탁소', '셀프빨래방', 'OO 세탁'],
+            'cafe': ['스타벅스 OO점', '동네 카페', '커피집'],
+            }
+
+def random_rows(facilities_type: List[str], max_per_kind: int) -> List[Tuple]:
+    rows = []
+    for kind in facilities_type:
+        names = SAMPLE_NAMES.get(kind, [f'{kind} 장소'])
+        for i in range(random.randint(0, max_per_kind)):
+            rows.append((random.choice(names), kind, random.uniform(0, 1000), f'주소 {i}',
+                         37.5 + random.uniform(-0.01, 0.01), 127.0 + random.uniform(-0.01, 0.01)))
+
+    rows.sort(key=lambda row: row[2])
+    return rows
+
+
+# 검색 결과가 0개면 score가 nan이므로 nan끼리는 같은 값으로 비교
+# 현재 구현은 NaN score를 None으로 돌려줌
+def same_score(a: Tuple[Dict, float], b: Tuple[Dict, float]) -> bool:
+    def values(score: Tuple[Dict, float]) -> List[float]:
+        return [np.nan if value is None else value for value in list(score[0].values()) + [score[1]]]
+    return list(a[0]) == list(b[0]) and np.array_equal(values(a), values(b), equal_nan=True)
+
+
+def measure(func, cases: list) -> List[float]:
+    elapsed = []
+    for case in cases:
+        start = time.perf_counter()
+        func(*case)
+        elapsed.append((time.perf_counter() - start) * 1000)
+
+    return sorted(elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', type=int, default=500, help='측정할 검색 결과 개수')
+    parser.add_argument('--max-per-kind', type=int, default=30, help='업종별 최대 row 개수')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    cases = []
+    for _ in range(args.cases):
+        facilities_type = random.sample(FACILITY_TYPES, random.randint(1, len(FACILITY_TYPES)))
+        cases.append((facilities_type, random_rows(facilities_type, args.max_per_kind)))
+
+    # 결과 비교 (legacy는 print를 하고 facilities_type을 바꾸므로 복사본과 버리는 stdout 사용)
+    mismatch = 0
+    with redirect_stdout(io.StringIO()):
+        for facilities_type, rows in cases:
+            legacy = legacy_make_response_list(facilities_type, rows)
+            current = make_response_list(facilities_type, rows)
+            if legacy != current:
+                mismatch += 1
+                continue
+
+            if facilities_type != ['metro']:
+                legacy_score = legacy_calculate_score(list(facilities_type), legacy[0], legacy[1])
+                if not same_score(legacy_score, calculate_score(facilities_type, current[0], current[1])):
+                    mismatch += 1
+    print(f"결과가 다른 경우: {mismatch} / {len(cases)}\n")
+
+    # 지하철만 있는 조합은 score 계산 대상이 아님
+    score_cases = []
+    for facilities_type, rows in cases:
+        if facilities_type != ['metro']:
+            total_count, facility_body, _ = make_response_list(facilities_type, rows)
+            score_cases.append((facilities_type, total_count, facility_body))
+
+    with redirect_stdout(io.StringIO()):
+        results = {
+                'hashtag (legacy)': measure(legacy_make_response_list, cases),
+                'hashtag (current)': measure(make_response_list, cases),
+                'score (legacy)': measure(lambda facilities_type, total, body: legacy_calculate_score(list(facilities_type), total, body), score_cases),
+                'score (current)': measure(calculate_score, score_cases),
+                }
+
+    for name, elapsed in results.items():
+        print(f"[{name}] latency(ms): mean {statistics.mean(elapsed):.3f}, p50 {elapsed[len(elapsed) // 2]:.3f}, p95 {elapsed[int(len(elapsed) * 0.95) - 1]:.3f}")
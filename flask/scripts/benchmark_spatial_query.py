@@ -0,0 +1,150 @@
+"""
+- Benchmark radius query shapes on synthetic tables
+- legacy : ST_Contains(ST_Buffer(location, radius), coordinates) AND ST_Distance_Sphere(...)
+- mbr    : MBRContains(envelope, coordinates) AND ST_Distance_Sphere(...)   (utils.rds_query)
+- EXPLAIN 결과(access type, key, rows)와 실제 실행시간, Handler_read_* 로 본 읽은 row 수 비교
+"""
+
+import sys
+import os
+import warnings
+warnings.filterwarnings(action='ignore')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import statistics
+import time
+from typing import Tuple
+from tqdm import tqdm
+
+from utils.db_connector import DBManagement
+from utils.rds_query import RADIUS_WHERE_TEMPLATE, radius_where_params
+
+current_file_path = os.path.abspath(__file__)
+root_path = os.path.dirname(os.path.dirname(current_file_path))
+
+# 서울 부근 범위
+LAT_RANGE = (37.40, 37.70)
+LON_RANGE = (126.75, 127.20)
+
+
+# (WHERE 절, parameters)
+def legacy_where_query(lat: float, lon: float, radius_meter: int) -> Tuple[str, list]:
+    location = 'ST_GeomFromText(%s, 4326)'
+    point = f"POINT({lat} {lon})"
+    return (f"ST_Contains(ST_Buffer({location}, %s), coordinates) AND ST_Distance_Sphere({location}, coordinates) < %s",
+            [point, radius_meter, point, radius_meter])
+
+def mbr_where_query(lat: float, lon: float, radius_meter: int) -> Tuple[str, list]:
+    return RADIUS_WHERE_TEMPLATE, radius_where_params(lat, lon, radius_meter)
+
+
+def create_synthetic_table(dbm: DBManagement, table_name: str, row_count: int, pivot: int = 1000) -> None:
+    dbm.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+    dbm.cursor.execute(f"""
+                    CREATE TABLE {table_name}
+                    (
+                    id INT AUTO_INCREMENT,
+                    name VARCHAR(64),
+                    lat DOUBLE,
+                    lon DOUBLE,
+                    coordinates POINT NOT NULL SRID 4326,
+                    PRIMARY KEY(id)
+                    );
+                    """)
+
+    for start in tqdm(range(0, row_count, pivot)):
+        values = []
+        for i in range(start, min(start + pivot, row_count)):
+            lat, lon = random.uniform(*LAT_RANGE), random.uniform(*LON_RANGE)
+            values.append(f"('place{i}', {lat}, {lon}, ST_GeomFromText('POINT({lat} {lon})', 4326))")
+
+        dbm.cursor.execute(f"INSERT INTO {table_name} (name, lat, lon, coordinates) VALUES {', '.join(values)};")
+        dbm.commit()
+
+    dbm.create_spatial_index(table_name, 'coordinates')
+    dbm.cursor.execute(f"ANALYZE TABLE {table_name}")
+    dbm.cursor.fetchall()
+    dbm.commit()
+
+
+def handler_reads(dbm: DBManagement) -> int:
+    dbm.cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+    return sum(int(value) for _, value in dbm.cursor.fetchall())
+
+
+def run_shape(dbm: DBManagement, table_name: str, where_query: Tuple[str, list], status_overhead: int = 0) -> dict:
+    where_template, params = where_query
+    select_query = f"SELECT name, lat, lon FROM {table_name} WHERE {where_template}"
+
+    dbm.cursor.execute(f"EXPLAIN {select_query}", params)
+    columns = [column[0] for column in dbm.cursor.description]
+    explain = dict(zip(columns, dbm.cursor.fetchall()[0]))
+
+    before = handler_reads(dbm)
+    start = time.perf_counter()
+    dbm.cursor.execute(select_query, params)
+    result_count = len(dbm.cursor.fetchall())
+    elapsed = time.perf_counter() - start
+    # SHOW STATUS 자체가 읽는 row가 섞이지 않도록 빼줌
+    rows_read = handler_reads(dbm) - before - status_overhead
+
+    return {
+            'type': explain.get('type'),
+            'key': explain.get('key'),
+            'estimated_rows': explain.get('rows'),
+            'rows_read': rows_read,
+            'result_count': result_count,
+            'elapsed_ms': elapsed * 1000,
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000, help='synthetic table row 개수')
+    parser.add_argument('--queries', type=int, default=50, help='측정할 검색 위치 개수')
+    parser.add_argument('--radius', type=int, default=1000, help='검색 반경(m)')
+    parser.add_argument('--table', type=str, default='bench_facility')
+    parser.add_argument('--keep', action='store_true', help='측정 후 table을 지우지 않음')
+    args = parser.parse_args()
+
+    # db connection
+    db_info_path = os.path.join(root_path, 'secret_key', 'db_info.txt')
+    db_info_dict = DBManagement.get_db_info(db_info_path)
+    dbm = DBManagement(**db_info_dict, autocommit=True)
+    print(f'성공적으로 MySQL {db_info_dict["database"]} 데이터베이스에 연결 완료')
+
+    create_synthetic_table(dbm, args.table, args.rows)
+    print(f"{args.table} ({args.rows}개) 생성 완료\n")
+
+    # SHOW STATUS 한번에 더해지는 값 (측정 보정용)
+    first_read = handler_reads(dbm)
+    status_overhead = handler_reads(dbm) - first_read
+
+    shapes = {'legacy': legacy_where_query, 'mbr': mbr_where_query}
+    results = {name: [] for name in shapes}
+
+    centers = [(random.uniform(*LAT_RANGE), random.uniform(*LON_RANGE)) for _ in range(args.queries)]
+    for lat, lon in tqdm(centers):
+        counts = set()
+        for name, where_builder in shapes.items():
+            result = run_shape(dbm, args.table, where_builder(lat, lon, args.radius), status_overhead)
+            results[name].append(result)
+            counts.add(result['result_count'])
+
+        # 두 query의 결과 개수가 같아야 함
+        if len(counts) != 1:
+            print(f"결과 개수가 다릅니다: ({lat}, {lon}) -> {counts}")
+
+    for name, result_list in results.items():
+        first = result_list[0]
+        elapsed = sorted(result['elapsed_ms'] for result in result_list)
+        print(f"[{name}] EXPLAIN type={first['type']}, key={first['key']}, estimated rows={first['estimated_rows']}")
+        print(f"    rows read  : 평균 {statistics.mean(r['rows_read'] for r in result_list):.0f}")
+        print(f"    results    : 평균 {statistics.mean(r['result_count'] for r in result_list):.1f}")
+        print(f"    latency(ms): p50 {elapsed[len(elapsed) // 2]:.2f}, p95 {elapsed[int(len(elapsed) * 0.95) - 1]:.2f}, max {elapsed[-1]:.2f}")
+
+    if not args.keep:
+        dbm.drop_table(args.table)
+    dbm.close()
@@ -12,6 +12,14 @@ from tqdm import tqdm
 from utils.load_data import RequestSeoulBusData, RequestOtherBusData
 from utils.preprocess import SeoulBusDataPreprocess, OtherBusDataPreprocess
 from utils.db_connector import DBManagement
+from utils.response_cache import mark_invalidated
+from utils.unified_facility import sync_unified_table
+from utils.grid_aggregate import rebuild_grid_counts
+from utils.spatial_engine import export_facility_snapshot
+from utils.heatmap import export_heatmap_tiles
+from utils.data_version import bump_data_version
+from utils.cache_warmer import run_cache_warmup
+from utils.score_weights import update_score_weights
 
 current_file_path = os.path.abspath(__file__)
 root_path = os.path.dirname(os.path.dirname(current_file_path))
@@ -95,6 +103,29 @@ if __name__ == "__main__":
     dbm.create_spatial_index(table_name, 'coordinates')
     dbm.commit()
 
+    # 통합 facility table, 격자 집계 table에도 반영
+    sync_unified_table(dbm, table_name)
+    rebuild_grid_counts(dbm, table_name)
+
+    # serving 중인 response cache에 갱신 알림
+    mark_invalidated([table_name])
+
+    # score 가중치(업종별 전체 데이터 개수) 갱신
+    score_weights = update_score_weights(dbm, [table_name])
+    print(f"score 가중치 version {score_weights.version} 저장")
+
+    # memory backend용 facility snapshot 교체
+    export_facility_snapshot(dbm)
+
+    # snapshot으로 score heatmap tile 개수 배열 다시 계산
+    export_heatmap_tiles()
+
+    # 전체 데이터 version을 올려서 응답 ETag(nginx/browser cache)가 바뀌도록 함
+    print(f"데이터 version {bump_data_version()} 저장")
+
+    # access log의 인기 검색을 다시 보내서 아침 peak 전에 cache, DB buffer pool 채우기
+    run_cache_warmup()
+
     print("버스데이터 작업 완료")
     dbm.cursor.close()
 
@@ -17,6 +17,14 @@ from tqdm import tqdm
 from utils.load_data import RequestLocalData
 from utils.preprocess import LocalDataPreprocess
 from utils.db_connector import DBManagement
+from utils.response_cache import mark_invalidated
+from utils.unified_facility import sync_unified_table
+from utils.grid_aggregate import GridCountDelta
+from utils.spatial_engine import export_facility_snapshot
+from utils.heatmap import export_heatmap_tiles
+from utils.data_version import bump_data_version
+from utils.cache_warmer import run_cache_warmup
+from utils.score_weights import update_score_weights
 
 current_file_path = os.path.abspath(__file__)
 root_path = os.path.dirname(os.path.dirname(current_file_path))
@@ -56,6 +64,8 @@ if __name__ == "__main__":
     # request 객체
     api_request = RequestLocalData(auth_key_local)
 
+    # 적재한 table 이름 (score 가중치 갱신 대상)
+    loaded_tables = []
     for folder_name in folder_names_list:
         
         # csv파일에 해당하는 서비스이름 파일 호출
@@ -106,8 +116,12 @@ if __name__ == "__main__":
         updated_df = service_dataframe[service_dataframe['trdStateGbn'].isin(['"1"', '"2"'])]
 
 
+        # 격자 집계 table은 바뀌는 row의 이전 값(-1), 새 값(+1)만큼만 증감
+        grid_delta = GridCountDelta(table_name)
+
         # deleted
         values_all = deleted_df[['opnSfTeamCode', 'mgtNo', 'opnSvcId']].to_records(index=False).tolist()
+        grid_delta.remove(dbm, values_all)
 
         for opnSfTeamCode, mgtNo, opnSvcId in values_all:
             dbm.delete_record(table_name = table_name, opnSfTeamCode=opnSfTeamCode, mgtNo=mgtNo, opnSvcId=opnSvcId)
@@ -121,7 +135,10 @@ if __name__ == "__main__":
         
         for _ in tqdm(range(iteration)):
             tmp_df = updated_df.iloc[n:n+pivot]
+            keys = tmp_df[['opnSfTeamCode', 'mgtNo', 'opnSvcId']].to_records(index=False).tolist()
+            grid_delta.remove(dbm, keys)
             dbm.update_record(table_name, tmp_df, localdata_table_columns)
+            grid_delta.add(dbm, keys)
             dbm.commit()
             n += pivot
             if _ % 60 == 0:
@@ -129,8 +146,32 @@ if __name__ == "__main__":
         
 
         print(f"갱신 후 전체 데이터 개수: {dbm.table_size(table_name)}")
+        print(f"격자 집계 table {grid_delta.apply(dbm)}개 cell 갱신")
+
+        # 통합 facility table에도 반영
+        sync_unified_table(dbm, table_name)
+
+        # serving 중인 response cache에 갱신 알림
+        mark_invalidated([table_name])
+        loaded_tables.append(table_name)
         print(f"{folder_name} 완료\n")
 
+    # score 가중치(업종별 전체 데이터 개수) 갱신
+    score_weights = update_score_weights(dbm, loaded_tables)
+    print(f"score 가중치 version {score_weights.version} 저장")
+
+    # memory backend용 facility snapshot 교체
+    export_facility_snapshot(dbm)
+
+    # snapshot으로 score heatmap tile 개수 배열 다시 계산
+    export_heatmap_tiles()
+
+    # 전체 데이터 version을 올려서 응답 ETag(nginx/browser cache)가 바뀌도록 함
+    print(f"데이터 version {bump_data_version()} 저장")
+
+    # access log의 인기 검색을 다시 보내서 아침 peak 전에 cache, DB buffer pool 채우기
+    run_cache_warmup()
+
     dbm.cursor.close()
 
 
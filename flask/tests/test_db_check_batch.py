@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as mappy_app
+from utils.manage_response import make_response_list
+
+# /db_check_batch NDJSON 응답 - DB 없이 검색 결과(row)를 고정해서 확인
+## row: (name, kind, distance, address, lat, lon)
+ROWS = {
+        (37.5, 127.0): [('스타벅스', 'cafe', 120.0, '서울', 37.5001, 127.0001),
+                        ('온누리약국', 'pharmacy', 300.0, '서울', 37.5020, 127.0010)],
+        (37.6, 127.1): [],
+        }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def search_batch_chunk(facilities_type, chunk_points, radius_meter, mode, k):
+        return [make_response_list(facilities_type, [row for row in ROWS[point] if row[1] in facilities_type])
+                for point in chunk_points]
+
+    monkeypatch.setattr(mappy_app, 'search_batch_chunk', search_batch_chunk)
+    return mappy_app.app.test_client()
+
+
+def ndjson_lines(response):
+    # 줄마다 엄격한 JSON (NaN 없음)
+    return [json.loads(line, parse_constant=lambda constant: pytest.fail(f'JSON이 아닌 값: {constant}'))
+            for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_zero_result_point_scores_are_null(client):
+    response = client.post('/db_check_batch', json={'facilities_type': 'cafe,pharmacy', 'radius': 500,
+                                                    'points': [[37.5, 127.0], [37.6, 127.1]]})
+    assert response.status_code == 200
+
+    found, empty = ndjson_lines(response)
+    assert found['index'] == 0 and 'status' not in found
+    assert found['total_count'] == 2
+    assert isinstance(found['score']['total_score'], float)
+
+    assert empty['index'] == 1 and 'status' not in empty
+    assert empty['total_count'] == 0
+    assert empty['score'] == {'total_score': None, 'individual_score': {'cafe': None, 'pharmacy': None}}
+
+
+def test_metro_only_request_has_no_score(client):
+    response = client.post('/db_check_batch', json={'facilities_type': 'metro', 'radius': 500,
+                                                    'points': [[37.5, 127.0], [37.6, 127.1]]})
+    assert response.status_code == 200
+
+    lines = ndjson_lines(response)
+    assert [line['index'] for line in lines] == [0, 1]
+    for line in lines:
+        assert 'status' not in line
+        assert line['score'] == {'total_score': None, 'individual_score': {}}
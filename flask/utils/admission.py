@@ -0,0 +1,111 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from utils import config
+
+
+class OverloadedError(Exception):
+    """
+    DB 앞의 대기열이 가득 찼거나 요청 deadline 안에 처리할 수 없을 때 - 503으로 응답
+    """
+    pass
+
+
+# 현재 요청의 deadline (time.monotonic 기준) - thread pool로 넘길 때는 contextvars.copy_context() 사용
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+@contextmanager
+def request_deadline(seconds: float = None) -> Iterator[None]:
+    seconds = config.REQUEST_DEADLINE_SECONDS if seconds is None else seconds
+    if seconds <= 0:
+        yield
+        return
+
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_seconds() -> Optional[float]:
+    """
+    deadline까지 남은 시간 (deadline이 없으면 None)
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class AdmissionController:
+    """
+    DB query 동시 실행 개수 제한 (thread-safe)
+    - max_in_flight 개까지 바로 실행, 그 이상은 max_queue 개까지만 대기
+    - 대기열이 가득 차거나 제한 시간 안에 차례가 오지 않으면 기다리지 않고 OverloadedError
+    """
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 8) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+        self._stats = {
+                    'admitted': 0,
+                    'queued': 0,
+                    'rejected_queue_full': 0,
+                    'rejected_deadline': 0,
+                    'max_queue_depth': 0,
+                    }
+
+    def acquire(self, timeout: float) -> None:
+        with self._cond:
+            if self._in_flight < self.max_in_flight and self._waiting == 0:
+                self._in_flight += 1
+                self._stats['admitted'] += 1
+                return
+
+            if self._waiting >= self.max_queue:
+                self._stats['rejected_queue_full'] += 1
+                raise OverloadedError(f"DB 대기열이 가득 찼습니다 (in_flight={self._in_flight}, queue={self._waiting})")
+
+            self._waiting += 1
+            self._stats['queued'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._waiting)
+            try:
+                deadline = time.monotonic() + timeout
+                while self._in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['rejected_deadline'] += 1
+                        raise OverloadedError(f"DB 대기 시간이 초과되었습니다 ({timeout:.2f}s)")
+                    self._cond.wait(remaining)
+
+                self._in_flight += 1
+                self._stats['admitted'] += 1
+            finally:
+                self._waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def reject_deadline(self) -> None:
+        with self._cond:
+            self._stats['rejected_deadline'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+            stats['queue_depth'] = self._waiting
+            stats['max_in_flight'] = self.max_in_flight
+            stats['max_queue'] = self.max_queue
+
+        return stats
@@ -0,0 +1,153 @@
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qsl
+
+from utils.response_cache import geohash_encode
+from utils import config
+
+# 갱신 후 cache warm-up
+## nginx access log에서 자주 들어온 검색을 (geohash cell로 맞춘 좌표, 업종 조합, 나머지 parameter) 단위로 세고,
+## 많은 순으로 대표 요청 하나씩 다시 보내서 nginx uwsgi_cache, worker response cache, DB buffer pool을 채움
+WARMER_USER_AGENT = 'mappy-cache-warmer'
+
+# warm-up 대상 endpoint
+WARMUP_PATHS = ('/db_check', '/db_check_two', '/nearest', '/viewport', '/heatmap/')
+
+# 위치 parameter 쌍 - geohash cell로 맞춰서 묶음
+LOCATION_PARAMS = (('lat', 'lon'), ('lat_1', 'lon_1'), ('lat_2', 'lon_2'))
+
+# nginx 기본(combined) log 형식의 request line
+REQUEST_LINE_PATTERN = re.compile(r'"GET (?P<uri>/\S*) HTTP/[\d.]+" (?P<status>\d{3}) ')
+
+
+def _read_tail(path: str, max_bytes: int) -> List[str]:
+    """
+    log 파일 끝에서 max_bytes 만큼의 줄 (첫 줄은 잘려 있을 수 있으므로 버림)
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - max_bytes, 0))
+        lines = f.read().decode('utf-8', errors='replace').splitlines()
+
+    return lines[1:] if size > max_bytes else lines
+
+def snapped_key(uri: str) -> Tuple:
+    """
+    같은 검색으로 볼 요청들의 key - 좌표는 geohash cell, facilities_type은 순서/중복 무시
+    """
+    path, _, query = uri.partition('?')
+    params = dict(parse_qsl(query))
+    params.pop('format', None)
+
+    if 'facilities_type' in params:
+        params['facilities_type'] = ','.join(sorted({facility.strip() for facility in params['facilities_type'].split(',')}))
+
+    for lat_key, lon_key in LOCATION_PARAMS:
+        if lat_key in params and lon_key in params:
+            # 좌표가 숫자가 아니면 원래 값 그대로 key에 남김
+            try:
+                lat, lon = float(params[lat_key]), float(params[lon_key])
+            except ValueError:
+                continue
+            del params[lon_key]
+            params[lat_key] = geohash_encode(lat, lon, config.RESPONSE_CACHE_GEOHASH_PRECISION)
+
+    return (path, tuple(sorted(params.items())))
+
+def popular_requests(log_path: str = None, top_n: int = None) -> List[Tuple[str, int]]:
+    """
+    access log에서 많이 들어온 검색 top_n개의 (대표 uri, 요청 수)
+    - 대표 uri는 같은 key 안에서 가장 많이 들어온 uri (nginx cache key와 같도록 원래 query 그대로 사용)
+    """
+    log_path = log_path or config.WARMUP_ACCESS_LOG_PATH
+    top_n = top_n or config.WARMUP_TOP_N
+
+    key_counts = Counter()
+    uri_counts = defaultdict(Counter)
+    for line in _read_tail(log_path, config.WARMUP_LOG_MAX_BYTES):
+        # warm-up 요청 자신은 세지 않음
+        if WARMER_USER_AGENT in line:
+            continue
+
+        match = REQUEST_LINE_PATTERN.search(line)
+        if match is None or match.group('status') not in ('200', '304'):
+            continue
+
+        uri = match.group('uri')
+        if not uri.startswith(WARMUP_PATHS):
+            continue
+
+        key = snapped_key(uri)
+        key_counts[key] += 1
+        uri_counts[key][uri] += 1
+
+    return [(uri_counts[key].most_common(1)[0][0], count) for key, count in key_counts.most_common(top_n)]
+
+def _replay(base_url: str, uri: str, timeout: float) -> Tuple[bool, str]:
+    # X-Cache-Warm: nginx cache에 있어도 upstream에서 새로 받아서 cache에 저장
+    warm_request = urllib.request.Request(base_url.rstrip('/') + uri,
+                                          headers={'User-Agent': WARMER_USER_AGENT, 'X-Cache-Warm': '1'})
+    try:
+        with urllib.request.urlopen(warm_request, timeout=timeout) as response:
+            response.read()
+            return True, response.headers.get('X-Cache-Status', '-')
+    except (urllib.error.URLError, OSError):
+        return False, 'error'
+
+def reload_wait_seconds() -> float:
+    """
+    갱신 script가 쓴 파일들(data version, invalidation marker, snapshot, score 가중치, heatmap)을
+    worker가 모두 다시 읽을 때까지 걸리는 최대 시간
+    - 이보다 먼저 warm-up하면 이전 가중치/tile로 만든 응답이 새 data version ETag로 cache됨
+    """
+    return max(config.DATA_VERSION_CHECK_SECONDS, config.CACHE_INVALIDATION_CHECK_SECONDS,
+               config.FACILITY_SNAPSHOT_CHECK_SECONDS, config.SCORE_WEIGHT_CHECK_SECONDS,
+               config.HEATMAP_CHECK_SECONDS)
+
+def warm_cache(log_path: str = None, base_url: str = None, top_n: int = None) -> Dict:
+    """
+    warm-up 결과 report
+    - worker가 갱신된 파일을 모두 다시 읽을 때까지(reload_wait_seconds) 기다린 뒤 요청
+    """
+    base_url = base_url or config.WARMUP_BASE_URL
+    started_at = time.perf_counter()
+
+    try:
+        popular = popular_requests(log_path, top_n)
+    except FileNotFoundError:
+        popular = []
+
+    report = {'keys': len(popular), 'warmed': 0, 'failed': 0,
+              'requests_covered': sum(count for _, count in popular), 'cache_status': Counter()}
+
+    if popular:
+        time.sleep(reload_wait_seconds())
+
+        # worker process당 동시 DB query 제한(admission control)을 넘지 않도록 적은 thread로 보냄
+        with ThreadPoolExecutor(max_workers=config.WARMUP_CONCURRENCY) as executor:
+            results = executor.map(lambda item: _replay(base_url, item[0], config.WARMUP_TIMEOUT), popular)
+            for ok, cache_status in results:
+                report['warmed' if ok else 'failed'] += 1
+                report['cache_status'][cache_status] += 1
+
+    report['cache_status'] = dict(report['cache_status'])
+    report['seconds'] = round(time.perf_counter() - started_at, 3)
+    return report
+
+def run_cache_warmup() -> None:
+    """
+    갱신 script의 마지막에 호출 - WARMUP_ENABLED면 warm-up 후 report 출력
+    """
+    if not config.WARMUP_ENABLED:
+        return
+
+    report = warm_cache()
+    print(f"cache warm-up: {report['keys']}개 key (요청 {report['requests_covered']}건) 중 {report['warmed']}개 완료, "
+          f"{report['failed']}개 실패, {report['seconds']}초 소요, cache status {report['cache_status']}")
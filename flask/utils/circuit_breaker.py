@@ -0,0 +1,111 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple, Type
+
+from utils.admission import OverloadedError
+
+
+class CircuitOpenError(OverloadedError):
+    """
+    DB 장애로 circuit이 열려 있어 query를 보내지 않음
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    연속 실패(failure_errors 에러 또는 slow_call_seconds 보다 느린 호출)가 failure_threshold 번 나오면 open (thread-safe)
+    - failure_errors가 아닌 에러(SQL 오류 등)는 실패로 세지 않고 그대로 전달
+    - open      : reset_timeout 동안 호출하지 않고 바로 CircuitOpenError
+    - half_open : reset_timeout이 지나면 호출 하나만 시험으로 보내고, 성공하면 closed / 실패하면 다시 open
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, slow_call_seconds: float = 0.0,
+                 failure_errors: Tuple[Type[BaseException], ...] = (Exception,)) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_errors = failure_errors
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+        self._stats = {
+                    'opened': 0,
+                    'rejected': 0,
+                    'failures': 0,
+                    'slow_calls': 0,
+                    }
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+
+            self._stats['rejected'] += 1
+            raise CircuitOpenError("DB 응답이 없어 잠시 요청을 보내지 않습니다")
+
+    def on_success(self, elapsed: float) -> None:
+        if self.slow_call_seconds > 0 and elapsed > self.slow_call_seconds:
+            with self._lock:
+                self._stats['slow_calls'] += 1
+            self.on_failure()
+            return
+
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            self.state = self.CLOSED
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._stats['failures'] += 1
+            self._trial_running = False
+
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._stats['opened'] += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def on_ignored(self) -> None:
+        # 상태는 그대로 두고, half_open 시험 호출이었으면 다음 호출이 다시 시험하도록 함
+        with self._lock:
+            self._trial_running = False
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        self.before_call()
+        start = time.monotonic()
+        try:
+            yield
+        except self.failure_errors:
+            self.on_failure()
+            raise
+        except BaseException:
+            self.on_ignored()
+            raise
+        self.on_success(time.monotonic() - start)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.STATE_CODES[self.state]
+            stats['consecutive_failures'] = self._failures
+
+        return stats
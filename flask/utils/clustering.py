@@ -0,0 +1,67 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils import config
+
+# 지도 tile 한 변의 pixel 수 (Web Mercator zoom 0에서 전 세계가 256 x 256)
+TILE_SIZE = 256
+
+
+def mercator_pixels(lats: np.ndarray, lons: np.ndarray, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    world_size = TILE_SIZE * (1 << zoom)
+    sin_lat = np.clip(np.sin(np.radians(lats)), -0.9999, 0.9999)
+
+    x = (lons + 180.0) / 360.0 * world_size
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * world_size
+    return x, y
+
+def grid_clusters(lats: np.ndarray, lons: np.ndarray, zoom: int, cell_pixels: int = None) -> List[Dict]:
+    """
+    zoom level 화면에서 cell_pixels x cell_pixels pixel 격자 cell 단위로 묶은 cluster (개수 많은 순)
+    - cluster 위치는 cell 안 시설들의 평균 위경도
+    """
+    if len(lats) == 0:
+        return []
+
+    cell_pixels = cell_pixels or config.CLUSTER_CELL_PIXELS
+    x, y = mercator_pixels(lats, lons, zoom)
+    cells_per_row = int(TILE_SIZE * (1 << zoom) // cell_pixels) + 1
+    keys = np.floor(y / cell_pixels).astype(np.int64) * cells_per_row + np.floor(x / cell_pixels).astype(np.int64)
+
+    _, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse)
+    centroid_lats = np.bincount(inverse, weights=lats) / counts
+    centroid_lons = np.bincount(inverse, weights=lons) / counts
+
+    order = np.argsort(-counts, kind='stable')
+    return [{'lat': lat, 'lon': lon, 'count': count}
+            for lat, lon, count in zip(np.round(centroid_lats[order], 6).tolist(),
+                                       np.round(centroid_lons[order], 6).tolist(),
+                                       counts[order].tolist())]
+
+def _coordinates(places: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    lats = np.fromiter((place['lat'] for place in places), dtype=np.float64, count=len(places))
+    lons = np.fromiter((place['lon'] for place in places), dtype=np.float64, count=len(places))
+    return lats, lons
+
+def cluster_facility_body(facility_body: Dict[str, Dict], zoom: int) -> Dict[str, Dict]:
+    """
+    make_response_list의 facility_body -> 업종별 {'count', 'cluster'} (원본은 공유되므로 새 dict로 만듦)
+    """
+    clustered = {}
+    for facility, body in facility_body.items():
+        clustered[facility] = {'count': body['count'], 'cluster': grid_clusters(*_coordinates(body['place']), zoom)}
+
+    return clustered
+
+def cluster_places(facilities_type: List[str], places: List[Dict], zoom: int) -> Dict[str, Dict]:
+    """
+    search_viewport의 places ('kind' 포함) -> 업종별 {'count', 'cluster'}
+    """
+    by_kind = {facility: [] for facility in facilities_type}
+    for place in places:
+        by_kind[place['kind']].append(place)
+
+    return {facility: {'count': len(kind_places), 'cluster': grid_clusters(*_coordinates(kind_places), zoom)}
+            for facility, kind_places in by_kind.items()}
@@ -0,0 +1,148 @@
+import os
+
+current_file_path = os.path.abspath(__file__)
+root_path = os.path.dirname(os.path.dirname(current_file_path))
+
+
+# 환경변수(docker-compose environment)로 serving 설정값 읽기
+def env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+def env_str(name: str, default: str) -> str:
+    value = os.environ.get(name)
+    return value if value not in (None, '') else default
+
+
+# DB 접속 정보 파일
+DB_INFO_PATH = env_str('DB_INFO_PATH', os.path.join(root_path, 'secret_key', 'db_info.txt'))
+
+# Connection pool (uWSGI worker process 마다 하나씩 생성됨)
+## processes x max_size 가 RDS max_connections 를 넘지 않도록 설정할 것
+## /db_check_two 는 요청 하나가 connection 2개를 동시에 사용하므로 threads x 2
+DB_POOL_MIN_SIZE     = env_int('DB_POOL_MIN_SIZE', 1)
+DB_POOL_MAX_SIZE     = env_int('DB_POOL_MAX_SIZE', 4)
+DB_POOL_IDLE_TIMEOUT = env_float('DB_POOL_IDLE_TIMEOUT', 300.0)   # seconds
+DB_POOL_WAIT_TIMEOUT = env_float('DB_POOL_WAIT_TIMEOUT', 10.0)    # seconds
+
+# Read replica (db_info.txt에 replica_hosts = host1, host2:3306 처럼 쉼표로 구분)
+## 읽기 query는 replica로 보내고, 복제 지연이 크거나 접속이 안 되면 primary 사용
+READ_REPLICA_ENABLED      = env_int('READ_REPLICA_ENABLED', 1)
+REPLICA_MAX_LAG_SECONDS   = env_float('REPLICA_MAX_LAG_SECONDS', 5.0)
+REPLICA_LAG_CHECK_SECONDS = env_float('REPLICA_LAG_CHECK_SECONDS', 5.0)
+REPLICA_RETRY_SECONDS     = env_float('REPLICA_RETRY_SECONDS', 30.0)    # 접속 실패한 replica를 다시 시도하기까지
+REPLICA_CONNECT_TIMEOUT   = env_float('REPLICA_CONNECT_TIMEOUT', 2.0)    # seconds
+
+# connection 하나가 유지하는 prepared statement 개수 (업종 조합 단위)
+## processes x pool max_size x 이 값이 MySQL max_prepared_stmt_count 보다 작아야 함
+PREPARED_STATEMENT_CACHE_SIZE = env_int('PREPARED_STATEMENT_CACHE_SIZE', 64)
+
+# 여러 위치 동시 검색용 thread 개수 (worker process 당)
+LOOKUP_THREADS = env_int('LOOKUP_THREADS', 4)
+
+# /db_check_batch - 요청당 최대 위치 개수, grouped query 하나에 묶는 위치 개수
+BATCH_MAX_POINTS  = env_int('BATCH_MAX_POINTS', 100)
+BATCH_QUERY_CHUNK = env_int('BATCH_QUERY_CHUNK', 10)
+
+# mode=top_k 에서 허용하는 최대 k
+TOP_K_MAX = env_int('TOP_K_MAX', 50)
+
+# /nearest - 반경과 관계없이 업종별 가까운 k개 (k 최대값은 TOP_K_MAX)
+## KNN_START_RADIUS 부터 검색해서 k개가 안 되는 업종만 KNN_RADIUS_GROWTH배씩 넓혀 KNN_MAX_RADIUS 까지 다시 검색
+KNN_START_RADIUS  = env_int('KNN_START_RADIUS', 500)
+KNN_MAX_RADIUS    = env_int('KNN_MAX_RADIUS', 20000)
+KNN_RADIUS_GROWTH = env_int('KNN_RADIUS_GROWTH', 4)     # 2 이상 (1 이하면 1m씩만 넓어짐)
+
+# /viewport - page 크기 기본값, 최대값
+VIEWPORT_PAGE_SIZE = env_int('VIEWPORT_PAGE_SIZE', 200)
+VIEWPORT_PAGE_MAX  = env_int('VIEWPORT_PAGE_MAX', 1000)
+
+# 장소 목록 대신 지도 zoom level의 격자 cluster로 응답 (cluster_zoom parameter)
+CLUSTER_CELL_PIXELS  = env_int('CLUSTER_CELL_PIXELS', 60)       # cluster 한 칸의 화면 pixel 크기
+CLUSTER_MAX_ZOOM     = env_int('CLUSTER_MAX_ZOOM', 22)
+VIEWPORT_CLUSTER_MAX = env_int('VIEWPORT_CLUSTER_MAX', 50000)   # /viewport cluster 응답에서 묶을 최대 시설 개수
+
+# 업종별 table 대신 통합 facility table(category column)로 검색 - 갱신 script가 함께 채움
+## /viewport는 이 설정과 관계없이 항상 통합 table 사용
+UNIFIED_FACILITY_TABLE = env_int('UNIFIED_FACILITY_TABLE', 0)
+
+# mode=count를 격자 cell별 개수 table(utils.grid_aggregate)로 계산 - 경계 cell의 row는 통합 facility table에서 거리 계산
+GRID_COUNT_ENABLED = env_int('GRID_COUNT_ENABLED', 0)
+
+# 반경 검색 backend ('rds': MySQL spatial query, 'memory': utils.spatial_engine)
+SERVING_BACKEND = env_str('SERVING_BACKEND', 'rds')
+
+# In-memory spatial engine
+SPATIAL_GRID_DEGREE           = env_float('SPATIAL_GRID_DEGREE', 0.01)           # 격자 한 칸 크기(도)
+SPATIAL_ENGINE_RELOAD_SECONDS = env_float('SPATIAL_ENGINE_RELOAD_SECONDS', 3600.0) # 0이면 갱신하지 않음
+## 갱신 script가 내보내는 columnar snapshot - 있으면 DB 대신 이 파일을 mmap으로 열어서 사용
+FACILITY_SNAPSHOT_PATH           = env_str('FACILITY_SNAPSHOT_PATH', os.path.join(root_path, 'data', 'facility_snapshot.bin'))
+FACILITY_SNAPSHOT_CHECK_SECONDS  = env_float('FACILITY_SNAPSHOT_CHECK_SECONDS', 5.0)   # 파일 교체 확인 주기
+
+# 반경 검색 response cache (geohash cell 단위 후보 집합 cache)
+RESPONSE_CACHE_ENABLED           = env_int('RESPONSE_CACHE_ENABLED', 1)
+RESPONSE_CACHE_MAX_ENTRIES       = env_int('RESPONSE_CACHE_MAX_ENTRIES', 10000)
+RESPONSE_CACHE_TTL               = env_float('RESPONSE_CACHE_TTL', 600.0)         # seconds
+RESPONSE_CACHE_GEOHASH_PRECISION = env_int('RESPONSE_CACHE_GEOHASH_PRECISION', 7)  # 7 = 약 150m x 150m
+CACHE_INVALIDATION_PATH          = env_str('CACHE_INVALIDATION_PATH', os.path.join(root_path, 'data', 'cache_invalidation.json'))
+CACHE_INVALIDATION_CHECK_SECONDS = env_float('CACHE_INVALIDATION_CHECK_SECONDS', 5.0)
+
+# Admission control (worker process 당 DB query 동시 실행 제한, 넘치면 503)
+## ADMISSION_MAX_IN_FLIGHT=0 이면 제한하지 않음
+ADMISSION_MAX_IN_FLIGHT  = env_int('ADMISSION_MAX_IN_FLIGHT', 4)
+ADMISSION_MAX_QUEUE      = env_int('ADMISSION_MAX_QUEUE', 8)
+ADMISSION_QUEUE_TIMEOUT  = env_float('ADMISSION_QUEUE_TIMEOUT', 1.0)     # seconds, 차례를 기다리는 최대 시간
+REQUEST_DEADLINE_SECONDS = env_float('REQUEST_DEADLINE_SECONDS', 3.0)    # 0이면 deadline 없음
+DB_MAX_EXECUTION_MS      = env_int('DB_MAX_EXECUTION_MS', 2000)          # MAX_EXECUTION_TIME hint, 0이면 붙이지 않음
+
+# Circuit breaker (연속 실패 시 DB로 보내지 않고 마지막 정상 결과를 stale로 응답)
+BREAKER_FAILURE_THRESHOLD = env_int('BREAKER_FAILURE_THRESHOLD', 5)
+BREAKER_RESET_SECONDS     = env_float('BREAKER_RESET_SECONDS', 10.0)      # open 후 시험 query를 보내기까지
+BREAKER_SLOW_CALL_SECONDS = env_float('BREAKER_SLOW_CALL_SECONDS', 2.0)   # 이보다 느린 query도 실패로 셈, 0이면 사용 안 함
+## 마지막 정상 결과 (좌표는 geohash cell로 맞춰서 저장, 8 = 약 38m x 19m)
+STALE_CACHE_ENABLED           = env_int('STALE_CACHE_ENABLED', 1)
+STALE_CACHE_MAX_ENTRIES       = env_int('STALE_CACHE_MAX_ENTRIES', 20000)
+STALE_CACHE_TTL               = env_float('STALE_CACHE_TTL', 86400.0)      # seconds
+STALE_CACHE_GEOHASH_PRECISION = env_int('STALE_CACHE_GEOHASH_PRECISION', 8)
+STALE_REFRESH_MAX_PENDING     = env_int('STALE_REFRESH_MAX_PENDING', 1000) # DB 복구 후 다시 조회할 최대 개수
+
+# 동시에 들어온 같은 검색(업종, 좌표, 반경, mode)을 한번만 실행
+SINGLE_FLIGHT_ENABLED = env_int('SINGLE_FLIGHT_ENABLED', 1)
+
+# 단계별 소요시간 측정 (/metrics)
+METRICS_ENABLED       = env_int('METRICS_ENABLED', 1)
+## 설정하면 worker별 snapshot을 이 폴더에 써서 /metrics에서 전체 worker를 합산
+METRICS_DIR           = env_str('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = env_float('METRICS_FLUSH_SECONDS', 5.0)
+## 종료된 worker의 파일, 또는 METRICS_STALE_FLUSHES x METRICS_FLUSH_SECONDS 동안 갱신되지 않은 파일은 합산하지 않고 삭제
+METRICS_STALE_FLUSHES = env_int('METRICS_STALE_FLUSHES', 60)
+
+# score 가중치(업종별 전체 데이터 개수) snapshot - 갱신 script가 쓰고 worker가 주기적으로 확인
+SCORE_WEIGHT_PATH          = env_str('SCORE_WEIGHT_PATH', os.path.join(root_path, 'data', 'score_weights.json'))
+SCORE_WEIGHT_CHECK_SECONDS = env_float('SCORE_WEIGHT_CHECK_SECONDS', 30.0)
+
+# 전체 시설 데이터 version - 갱신 script가 마지막에 올리고 응답 ETag에 사용 (utils.http_cache)
+DATA_VERSION_PATH          = env_str('DATA_VERSION_PATH', os.path.join(root_path, 'data', 'data_version.json'))
+DATA_VERSION_CHECK_SECONDS = env_float('DATA_VERSION_CHECK_SECONDS', 5.0)
+HTTP_CACHE_MAX_AGE         = env_int('HTTP_CACHE_MAX_AGE', 300)     # 검색 응답 Cache-Control max-age, 0이면 ETag/Cache-Control 없음
+
+# 갱신 script 마지막에 access log의 인기 검색을 다시 보내서 cache warm-up (utils.cache_warmer)
+WARMUP_ENABLED         = env_int('WARMUP_ENABLED', 1)
+WARMUP_ACCESS_LOG_PATH = env_str('WARMUP_ACCESS_LOG_PATH', '/var/log/mappy/access.log')   # nginx access log (docker volume 공유)
+WARMUP_LOG_MAX_BYTES   = env_int('WARMUP_LOG_MAX_BYTES', 64 * 1024 * 1024)                # log 파일 끝에서 읽을 크기
+WARMUP_BASE_URL        = env_str('WARMUP_BASE_URL', 'http://nginx')
+WARMUP_TOP_N           = env_int('WARMUP_TOP_N', 500)       # 다시 보낼 검색 개수
+WARMUP_CONCURRENCY     = env_int('WARMUP_CONCURRENCY', 4)
+WARMUP_TIMEOUT         = env_float('WARMUP_TIMEOUT', 10.0)  # 요청 하나의 timeout (seconds)
+
+# score heatmap tile (/heatmap/<z>/<x>/<y>) - 갱신 script가 tile sub-cell 중심별 업종 개수를 미리 계산해서 저장
+HEATMAP_DIR           = env_str('HEATMAP_DIR', os.path.join(root_path, 'data', 'heatmap'))
+HEATMAP_ZOOMS         = env_str('HEATMAP_ZOOMS', '10,11,12,13')    # 미리 계산할 zoom level (쉼표 구분)
+HEATMAP_TILE_GRID     = env_int('HEATMAP_TILE_GRID', 16)          # tile 한 변의 sub-cell 개수
+HEATMAP_RADIUS_METER  = env_int('HEATMAP_RADIUS_METER', 500)      # sub-cell 중심에서 개수를 세는 반경
+HEATMAP_CHECK_SECONDS = env_float('HEATMAP_CHECK_SECONDS', 30.0)  # 파일 교체 확인 주기
+HEATMAP_CACHE_SECONDS = env_int('HEATMAP_CACHE_SECONDS', 3600)    # 응답 Cache-Control max-age
@@ -0,0 +1,40 @@
+import json
+import time
+from typing import Dict
+
+from utils.file_watch import FileWatcher, atomic_write_json
+from utils import config
+
+# 전체 시설 데이터 version
+## 갱신 script가 적재를 모두 끝낸 뒤 올리고, worker는 파일이 바뀌면 다시 읽어서 ETag에 사용
+def read_data_version(path: str = None) -> Dict:
+    path = path or config.DATA_VERSION_PATH
+
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+        return {'version': int(snapshot['version']), 'updated_at': float(snapshot['updated_at'])}
+    except (FileNotFoundError, ValueError, KeyError):
+        return {'version': 0, 'updated_at': 0.0}
+
+def bump_data_version(path: str = None) -> int:
+    """
+    갱신 script의 마지막에 호출
+    """
+    path = path or config.DATA_VERSION_PATH
+
+    version = read_data_version(path)['version'] + 1
+    atomic_write_json(path, {'version': version, 'updated_at': time.time()})
+
+    return version
+
+
+# worker에서 사용하는 현재 version
+_watcher = FileWatcher(config.DATA_VERSION_PATH, read_data_version, config.DATA_VERSION_CHECK_SECONDS,
+                       default={'version': 0, 'updated_at': 0.0})
+
+def current_data_version() -> int:
+    """
+    DATA_VERSION_CHECK_SECONDS 마다 파일이 바뀌었는지 확인
+    """
+    return _watcher.get()['version']
@@ -1,19 +1,34 @@
 import mysql.connector
 import pandas as pd
-from typing import List, Dict
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional
 from tqdm import tqdm
 
+# prepared cursor(binary protocol)는 driver 버전에 따라 문자열 column을 bytearray로 돌려주므로 str로 변환
+def decode_row(row: tuple) -> tuple:
+    return tuple(value.decode('utf-8') if isinstance(value, (bytes, bytearray)) else value for value in row)
+
+
 class DBManagement:
-    def __init__(self, host: str, user: str, password: str, database: str) -> None:
+    def __init__(self, host: str, user: str, password: str, database: str, replica_hosts: str = None, **connect_options) -> None:
         self.host = host
         self.user = user
         self.password = password
         self.database = database
+        # read replica 주소 (db_info.txt의 replica_hosts) - 이 객체의 connection은 항상 host(primary)로 연결
+        self.replica_hosts = replica_hosts
         self.cnx = mysql.connector.connect(host=self.host,
                                     user=self.user,
                                     password=self.password,
-                                    database=self.database)
+                                    database=self.database,
+                                    **connect_options)
         self.cursor = self.cnx.cursor()
+
+        # statement key -> prepared cursor (오래 안 쓴 것부터 정리)
+        self.prepared_cursors = OrderedDict()
     
     @staticmethod
     # bring db info in local text file(secret_key/db_info.txt)
@@ -29,6 +44,26 @@ class DBManagement:
                 db_info_dict[key] = val
 
         return db_info_dict
+
+    @staticmethod
+    # db_info.txt의 replica_hosts(쉼표로 구분, host 또는 host:port)로 replica별 접속 정보 생성
+    def get_replica_db_infos(db_info_dict: Dict[str, str]) -> List[Dict]:
+        replica_db_infos = []
+
+        for replica_host in (db_info_dict.get('replica_hosts') or '').split(','):
+            replica_host = replica_host.strip()
+            if not replica_host:
+                continue
+
+            replica_db_info = {key: val for key, val in db_info_dict.items() if key != 'replica_hosts'}
+            if ':' in replica_host:
+                replica_host, port = replica_host.rsplit(':', 1)
+                replica_db_info['port'] = int(port)
+            replica_db_info['host'] = replica_host
+            replica_db_infos.append(replica_db_info)
+
+        return replica_db_infos
+
     # Add quote for insert data to DB like address
     @staticmethod
     def replace_quote(value: str) -> str:
@@ -162,3 +197,392 @@ class DBManagement:
                     """
         self.cursor.execute(insert_query, (image_path, related_table_name, related_table_id))
         self.commit()
+
+    # 같은 key의 query는 connection 안에서 server-side prepared statement를 재사용
+    def execute_prepared(self, key, query: str, params: list, max_statements: int = 64) -> List:
+        cursor = self.prepared_cursors.pop(key, None)
+        if cursor is None:
+            cursor = self.cnx.cursor(prepared=True)
+        self.prepared_cursors[key] = cursor
+
+        # MySQL max_prepared_stmt_count를 넘지 않도록 오래된 statement 해제
+        while len(self.prepared_cursors) > max_statements:
+            _, old_cursor = self.prepared_cursors.popitem(last=False)
+            old_cursor.close()
+
+        cursor.execute(query, params)
+        return [decode_row(row) for row in cursor.fetchall()]
+
+    # replica면 복제 지연(초, 복제가 멈췄으면 None), replica가 아니면 0
+    def replication_lag(self) -> Optional[float]:
+        try:
+            self.cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            # MySQL 8.0.22 이전
+            self.cursor.execute("SHOW SLAVE STATUS")
+        rows = self.cursor.fetchall()
+        if not rows:
+            return 0.0
+
+        status = dict(zip([column[0] for column in self.cursor.description], rows[0]))
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return None if lag is None else float(lag)
+
+    # 연결이 살아있는지 확인(server ping)
+    def is_connected(self) -> bool:
+        try:
+            return self.cnx.is_connected()
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        for cursor in self.prepared_cursors.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.prepared_cursors.clear()
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+        try:
+            self.cnx.close()
+        except Exception:
+            pass
+
+
+# Exception for pool checkout timeout
+class PoolTimeoutError(Exception):
+    def __init__(self, timeout: float):
+        super().__init__(f'{timeout}초 동안 사용 가능한 DB connection이 없습니다.')
+
+
+class DBConnectionPool:
+    """
+    Thread-safe pool of DBManagement connections
+    - min_size: 항상 유지하는 connection 개수
+    - max_size: 동시에 열 수 있는 최대 connection 개수
+    - idle_timeout: 이 시간(초) 이상 쉬고 있는 connection은 min_size까지 정리
+    - wait_timeout: 모든 connection이 사용 중일 때 기다리는 최대 시간(초)
+    """
+
+    def __init__(self, db_info_dict: Dict[str, str], min_size: int = 1, max_size: int = 2,
+                 idle_timeout: float = 300.0, wait_timeout: float = 10.0) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f'잘못된 pool 크기입니다. (min_size={min_size}, max_size={max_size})')
+
+        self.db_info_dict = db_info_dict
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+
+        # (DBManagement, 반납 시각) - 가장 최근에 반납된 connection이 뒤에 위치
+        self._idle = []
+        self._in_use = 0
+        self._lock = threading.Condition(threading.Lock())
+
+        self._stats = {
+                    'created': 0,
+                    'closed': 0,
+                    'checkouts': 0,
+                    'waits': 0,
+                    'timeouts': 0,
+                    'health_check_failures': 0,
+                    'idle_evictions': 0,
+                    }
+
+        for _ in range(self.min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self) -> DBManagement:
+        # serving 용 connection은 autocommit으로 열어 오래된 snapshot을 읽지 않도록 함
+        dbm = DBManagement(**self.db_info_dict, autocommit=True)
+        self._incr('created')
+        return dbm
+
+    def _discard(self, dbm: DBManagement) -> None:
+        dbm.close()
+        self._incr('closed')
+
+    # lock 밖에서 통계값 증가
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    # idle_timeout이 지난 connection 정리(lock 안에서 호출)
+    def _evict_idle(self) -> List[DBManagement]:
+        now = time.monotonic()
+        evicted = []
+        while len(self._idle) + self._in_use > self.min_size and self._idle:
+            dbm, released_at = self._idle[0]
+            if now - released_at < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            evicted.append(dbm)
+            self._stats['idle_evictions'] += 1
+        return evicted
+
+    def acquire(self) -> DBManagement:
+        deadline = time.monotonic() + self.wait_timeout
+
+        with self._lock:
+            evicted = self._evict_idle()
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(self.wait_timeout)
+                self._stats['waits'] += 1
+                self._lock.wait(remaining)
+
+            dbm = self._idle.pop()[0] if self._idle else None
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+
+        for old in evicted:
+            self._discard(old)
+
+        # 네트워크 작업(health check, 새 연결)은 lock 밖에서 수행
+        try:
+            if dbm is not None and not dbm.is_connected():
+                self._incr('health_check_failures')
+                self._discard(dbm)
+                dbm = None
+            if dbm is None:
+                dbm = self._connect()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        return dbm
+
+    def release(self, dbm: DBManagement, discard: bool = False) -> None:
+        with self._lock:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append((dbm, time.monotonic()))
+            self._lock.notify()
+
+        if discard:
+            self._discard(dbm)
+
+    @contextmanager
+    def connection(self) -> Iterator[DBManagement]:
+        dbm = self.acquire()
+        try:
+            yield dbm
+        except Exception:
+            # query 도중 에러가 난 connection은 상태를 알 수 없으므로 버림
+            self.release(dbm, discard=True)
+            raise
+        else:
+            self.release(dbm)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for dbm, _ in idle:
+            self._discard(dbm)
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                        'min_size': self.min_size,
+                        'max_size': self.max_size,
+                        'in_use': self._in_use,
+                        'idle': len(self._idle),
+                        'size': self._in_use + len(self._idle),
+                        })
+        return stats
+
+
+class _ReplicaEndpoint:
+    def __init__(self, db_info_dict: Dict) -> None:
+        self.db_info_dict = db_info_dict
+        self.name = f"{db_info_dict['host']}:{db_info_dict.get('port', 3306)}"
+        self.pool: Optional[DBConnectionPool] = None
+        # 첫 확인 전에는 알 수 없으므로 primary 사용
+        self.lag: Optional[float] = None
+        self.lag_checked_at = 0.0
+        self.down_until = 0.0
+
+
+class ReplicaRouter:
+    """
+    primary + read replica 들의 connection pool (serving 읽기 전용, DBConnectionPool과 같은 acquire/release)
+    - 사용 중인 connection이 가장 적은 replica로 보내고, 같으면 돌아가면서 선택
+    - 복제 지연이 max_lag 보다 크거나, 연결에 실패했거나, connection이 모두 사용 중인 replica는 제외하고
+      남은 replica가 없으면 primary 사용
+    - 복제 지연은 background thread가 lag_check_interval 마다 확인 (요청 thread에서는 마지막 값만 읽음)
+    - replica 접속은 connect_timeout(초) 안에 안 되면 실패로 보고 retry_interval 동안 제외
+    - 쓰기(insert_record 등)는 이 router를 거치지 않고 DBManagement(primary)로만 수행
+    """
+
+    def __init__(self, db_info_dict: Dict[str, str], pool_options: Dict = None, max_lag: float = 5.0,
+                 lag_check_interval: float = 5.0, retry_interval: float = 30.0, connect_timeout: float = 2.0) -> None:
+        self.pool_options = pool_options or {}
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+
+        self.primary = DBConnectionPool(db_info_dict, **self.pool_options)
+        self.replicas = [_ReplicaEndpoint({**replica_db_info, 'connection_timeout': connect_timeout})
+                         for replica_db_info in DBManagement.get_replica_db_infos(db_info_dict)]
+
+        # 빌려준 connection -> 반납할 pool
+        self._owners = {}
+        self._round_robin = 0
+        self._lock = threading.Lock()
+
+        self._stats = {
+                    'replica_reads': 0,
+                    'primary_reads': 0,
+                    'replica_failures': 0,
+                    'lag_fallbacks': 0,
+                    }
+
+        self._stopped = threading.Event()
+        if self.replicas:
+            threading.Thread(target=self._lag_check_loop, daemon=True).start()
+
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _mark_down(self, replica: _ReplicaEndpoint, error: Exception) -> None:
+        replica.down_until = time.monotonic() + self.retry_interval
+        self._incr('replica_failures')
+        print(f"read replica {replica.name} 제외 ({self.retry_interval}초): {error}")
+
+    def _replica_pool(self, replica: _ReplicaEndpoint) -> DBConnectionPool:
+        if replica.pool is None:
+            with self._lock:
+                if replica.pool is None:
+                    replica.pool = DBConnectionPool(replica.db_info_dict, **self.pool_options)
+        return replica.pool
+
+    def _check_lag(self, replica: _ReplicaEndpoint) -> None:
+        replica.lag_checked_at = time.monotonic()
+        try:
+            with self._replica_pool(replica).connection() as dbm:
+                replica.lag = dbm.replication_lag()
+        except PoolTimeoutError:
+            # connection이 모두 사용 중이면 살아 있는 것이므로 다음 주기에 다시 확인
+            pass
+        except Exception as e:
+            self._mark_down(replica, e)
+
+    def _lag_check_loop(self) -> None:
+        while True:
+            for replica in self.replicas:
+                # 제외된 replica는 retry_interval이 지난 뒤 다시 확인
+                if replica.down_until <= time.monotonic():
+                    self._check_lag(replica)
+            if self._stopped.wait(self.lag_check_interval):
+                return
+
+    def _pick_replica(self) -> Optional[_ReplicaEndpoint]:
+        now = time.monotonic()
+        candidates = []
+
+        for replica in self.replicas:
+            if replica.down_until > now:
+                continue
+            if replica.lag is None or replica.lag > self.max_lag:
+                continue
+            # connection이 모두 사용 중인 replica에서 기다리지 않음
+            if replica.pool is not None and replica.pool.in_use >= replica.pool.max_size:
+                continue
+            candidates.append(replica)
+
+        if not candidates:
+            if self.replicas:
+                self._incr('lag_fallbacks')
+            return None
+
+        with self._lock:
+            self._round_robin += 1
+            start = self._round_robin % len(candidates)
+        candidates = candidates[start:] + candidates[:start]
+
+        return min(candidates, key=lambda replica: replica.pool.in_use if replica.pool is not None else 0)
+
+    def acquire(self) -> DBManagement:
+        replica = self._pick_replica()
+        if replica is not None:
+            try:
+                pool = self._replica_pool(replica)
+                dbm = pool.acquire()
+            except PoolTimeoutError:
+                pool = None
+            except Exception as e:
+                self._mark_down(replica, e)
+                pool = None
+
+            if pool is not None:
+                with self._lock:
+                    self._owners[dbm] = pool
+                    self._stats['replica_reads'] += 1
+                return dbm
+
+        dbm = self.primary.acquire()
+        with self._lock:
+            self._owners[dbm] = self.primary
+            self._stats['primary_reads'] += 1
+        return dbm
+
+    def release(self, dbm: DBManagement, discard: bool = False) -> None:
+        with self._lock:
+            pool = self._owners.pop(dbm)
+        pool.release(dbm, discard=discard)
+
+    @contextmanager
+    def connection(self) -> Iterator[DBManagement]:
+        dbm = self.acquire()
+        try:
+            yield dbm
+        except Exception:
+            self.release(dbm, discard=True)
+            raise
+        else:
+            self.release(dbm)
+
+    def close_all(self) -> None:
+        self._stopped.set()
+        self.primary.close_all()
+        for replica in self.replicas:
+            if replica.pool is not None:
+                replica.pool.close_all()
+
+    def endpoint_stats(self) -> Dict[str, Dict]:
+        endpoint_stats = {'primary': self.primary.stats()}
+        now = time.monotonic()
+        for replica in self.replicas:
+            stats = replica.pool.stats() if replica.pool is not None else {}
+            stats.update({'lag': replica.lag, 'available': replica.down_until <= now})
+            endpoint_stats[replica.name] = stats
+        return endpoint_stats
+
+    def stats(self) -> Dict[str, int]:
+        """
+        전체 pool 합계 + routing 통계
+        """
+        pools = [self.primary] + [replica.pool for replica in self.replicas if replica.pool is not None]
+        stats = {}
+        for pool in pools:
+            for key, value in pool.stats().items():
+                stats[key] = stats.get(key, 0) + value
+
+        with self._lock:
+            stats.update(self._stats)
+        stats['replicas'] = len(self.replicas)
+        return stats
@@ -0,0 +1,94 @@
+import json
+from typing import Dict
+
+from flask import Response
+
+# 선택 의존성 - 없으면 표준 json으로 대체하고, msgpack 응답은 제공하지 않음
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 응답 형식 (format query parameter 또는 Accept header)
+## json     : 장소마다 dict (기존 형식)
+## columnar : 업종마다 field별 배열 하나씩 ({'name': [...], 'distance': [...], ...})
+## msgpack  : columnar 형식을 MessagePack으로 encode
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_JSON_MIMETYPE = 'application/vnd.mappy.columnar+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+FORMAT_MIMETYPES = {
+                    'json': JSON_MIMETYPE,
+                    'columnar': COLUMNAR_JSON_MIMETYPE,
+                    'msgpack': MSGPACK_MIMETYPE,
+                    }
+MIMETYPE_FORMATS = {mimetype: response_format for response_format, mimetype in FORMAT_MIMETYPES.items()}
+MIMETYPE_FORMATS['application/x-msgpack'] = 'msgpack'
+
+# columnar로 바꿀 목록과 field 순서
+COLUMNAR_FIELDS = {
+                    'place': ('name', 'distance', 'address', 'lat', 'lon'),
+                    'cluster': ('lat', 'lon', 'count'),
+                    }
+
+
+def negotiate_format(request) -> str:
+    """
+    format parameter가 있으면 그대로 사용, 없으면 Accept header 중 가능한 형식 (기본 json)
+    """
+    response_format = request.args.get('format')
+    if response_format is not None:
+        if response_format not in FORMAT_MIMETYPES:
+            raise ValueError(f"format은 {', '.join(FORMAT_MIMETYPES)} 중 하나여야 합니다.")
+        if response_format == 'msgpack' and msgpack is None:
+            raise ValueError("이 서버에서는 format=msgpack을 사용할 수 없습니다.")
+        return response_format
+
+    available = [mimetype for mimetype, response_format in MIMETYPE_FORMATS.items()
+                 if response_format != 'msgpack' or msgpack is not None]
+    best = request.accept_mimetypes.best_match(available, default=JSON_MIMETYPE)
+    return MIMETYPE_FORMATS.get(best, 'json')
+
+def dumps_json(obj) -> bytes:
+    # orjson이 있으면 사용 (NaN은 null로 encode됨)
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def columnar_body(facility_body: Dict[str, Dict]) -> Dict[str, Dict]:
+    columnar = {}
+    for facility, body in facility_body.items():
+        columnar[facility] = dict(body)
+        for key, fields in COLUMNAR_FIELDS.items():
+            if key in body:
+                columnar[facility][key] = {field: [item[field] for item in body[key]] for field in fields}
+
+    return columnar
+
+def to_columnar(response_dict: Dict) -> Dict:
+    """
+    응답 안의 위치별 facility_type(location, location_1, ...)을 columnar로 바꾼 새 dict
+    """
+    columnar = dict(response_dict)
+    for key, value in response_dict.items():
+        if isinstance(value, dict) and 'facility_type' in value:
+            columnar[key] = dict(value, facility_type=columnar_body(value['facility_type']))
+
+    return columnar
+
+def encode_response(response_dict: Dict, response_format: str = 'json', status: int = 200) -> Response:
+    if response_format == 'json':
+        response = Response(dumps_json(response_dict), mimetype=JSON_MIMETYPE, status=status)
+    elif response_format == 'columnar':
+        response = Response(dumps_json(to_columnar(response_dict)), mimetype=COLUMNAR_JSON_MIMETYPE, status=status)
+    else:
+        response = Response(msgpack.packb(to_columnar(response_dict), use_bin_type=True), mimetype=MSGPACK_MIMETYPE, status=status)
+
+    # Accept header에 따라 응답이 달라지므로 cache는 Accept 별로 구분
+    response.headers['Vary'] = 'Accept'
+    return response
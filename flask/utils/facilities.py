@@ -0,0 +1,52 @@
+from typing import Iterable, List, Tuple
+
+# 서비스에서 제공하는 편의시설 종류 (= table 이름)
+FACILITY_TYPES = ['hospital', 'pharmacy', 'laundry', 'hair', 'gym', 'mart', 'convenience', 'cafe', 'bus', 'metro']
+
+# 통합 facility table의 category 값 (저장된 값이므로 번호를 바꾸지 말 것)
+FACILITY_CATEGORY_CODES = {facility: code for code, facility in enumerate(FACILITY_TYPES)}
+
+# 업종별 table에서 (이름, 주소) column
+## bus같은경우는 주소가 저장 안되어있으니 일단 NULL로 다 채우기
+FACILITY_COLUMNS = {
+                    'bus': ('StationName', 'NULL'),
+                    'metro': ('StationName', 'roadAddress'),
+                    }
+# 인허가(localdata) table 공통 column
+LOCALDATA_COLUMNS = ('bplcNm', 'rdnWhlAddr')
+
+def facility_columns(facility: str) -> Tuple[str, str]:
+    return FACILITY_COLUMNS.get(facility, LOCALDATA_COLUMNS)
+
+# 이름으로 판단하는 hashtag 키워드 (대소문자 구분)
+HASHTAG_KEYWORDS = {
+                    'gym': '헬스|짐|gym|피트니스|휘트니스|fitness|PT|피티',
+                    'laundry': '코인|크린토피아|셀프|24',
+                    'cafe': '스타벅스',
+                    }
+
+
+# Exception for facility type not in FACILITY_TYPES
+class InvalidFacilityError(ValueError):
+    def __init__(self, facility: str):
+        super().__init__(f"'{facility}'은(는) 지원하지 않는 편의시설 종류입니다.")
+
+# table 이름으로 query에 들어가므로 whitelist에 있는 업종만 허용
+def check_facilities(facilities_type: Iterable[str]) -> None:
+    for facility in facilities_type:
+        if facility not in FACILITY_TYPES:
+            raise InvalidFacilityError(facility)
+
+# 'bus,cafe' 또는 ['bus', 'cafe'] -> 중복을 제거한 업종 리스트 (순서 유지)
+def parse_facilities_type(value) -> List[str]:
+    if value is None:
+        raise ValueError('facilities_type이 필요합니다.')
+    if isinstance(value, str):
+        value = value.split(',')
+
+    facilities_type = list(dict.fromkeys(str(facility).strip() for facility in value))
+    if not facilities_type or facilities_type == ['']:
+        raise ValueError('facilities_type이 필요합니다.')
+    check_facilities(facilities_type)
+
+    return facilities_type
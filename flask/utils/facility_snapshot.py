@@ -0,0 +1,167 @@
+import json
+import mmap
+import struct
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils.file_watch import atomic_write
+
+# Columnar facility snapshot 파일 형식
+## [magic 8 bytes][header 길이 8 bytes][header JSON][배열들 (8 bytes 정렬)]
+## - 전체 row는 (업종, cell key) 순으로 정렬되어 있어 업종별로 연속된 구간(kind_ranges)을 가짐
+## - 이름/주소는 utf-8 문자열 heap + offset 배열(row 개수 + 1), NULL은 별도 mask로 저장
+## - worker들은 같은 파일을 read-only mmap으로 열기 때문에 page cache의 한 벌을 공유함
+MAGIC = b'MAPPYFS1'
+_HEADER_LENGTH = struct.Struct('<Q')
+_ALIGN = 8
+
+
+class StringColumn:
+    """
+    mmap된 문자열 heap 위의 문자열 column - index로 꺼낼 때만 decode
+    """
+
+    def __init__(self, buffer, heap_offset: int, offsets: np.ndarray, nulls: np.ndarray) -> None:
+        self._buffer = buffer
+        self._heap_offset = heap_offset
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def __getitem__(self, idx: np.ndarray) -> np.ndarray:
+        idx = np.asarray(idx, dtype=np.int64)
+        starts = (self.offsets[idx] + self._heap_offset).tolist()
+        ends = (self.offsets[idx + 1] + self._heap_offset).tolist()
+        nulls = self.nulls[idx].tolist()
+
+        values = np.empty(len(idx), dtype=object)
+        for i, (start, end, null) in enumerate(zip(starts, ends, nulls)):
+            values[i] = None if null else self._buffer[start:end].decode('utf-8')
+
+        return values
+
+    def slice(self, start: int, end: int) -> 'StringColumn':
+        return StringColumn(self._buffer, self._heap_offset, self.offsets[start:end + 1], self.nulls[start:end])
+
+
+def _encode_strings(values: List) -> Tuple[np.ndarray, np.ndarray, bytes]:
+    encoded = [b'' if value is None else str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    nulls = np.array([value is None for value in values], dtype=np.uint8)
+
+    return offsets, nulls, b''.join(encoded)
+
+def write_facility_snapshot(path: str, kind_columns: Dict[str, Dict], cell_degree: float) -> None:
+    """
+    kind_columns: {업종: {'keys', 'lats', 'lons', 'names', 'addresses'}} - 업종마다 keys 순으로 정렬된 값
+    - atomic_write로 교체하므로 읽는 쪽은 항상 완전한 파일만 봄
+    """
+    kinds = list(kind_columns)
+    kind_ranges, start = {}, 0
+    for kind in kinds:
+        kind_ranges[kind] = [start, start + len(kind_columns[kind]['keys'])]
+        start = kind_ranges[kind][1]
+
+    concat = lambda column, dtype: np.concatenate([np.asarray(kind_columns[kind][column], dtype=dtype) for kind in kinds]) \
+                                   if kinds else np.empty(0, dtype=dtype)
+    name_offsets, name_nulls, name_heap = _encode_strings([value for kind in kinds for value in kind_columns[kind]['names']])
+    address_offsets, address_nulls, address_heap = _encode_strings([value for kind in kinds for value in kind_columns[kind]['addresses']])
+
+    arrays = {
+            'keys': concat('keys', np.int64),
+            'lats': concat('lats', np.float64),
+            'lons': concat('lons', np.float64),
+            'kind': np.concatenate([np.full(end - start, code, dtype=np.uint8) for code, (start, end) in enumerate(kind_ranges.values())])
+                    if kinds else np.empty(0, dtype=np.uint8),
+            'name_offsets': name_offsets,
+            'name_nulls': name_nulls,
+            'name_heap': np.frombuffer(name_heap, dtype=np.uint8),
+            'address_offsets': address_offsets,
+            'address_nulls': address_nulls,
+            'address_heap': np.frombuffer(address_heap, dtype=np.uint8),
+            }
+
+    # header 크기를 알아야 배열 위치가 정해지므로 배열 위치는 data 영역 시작 기준 offset으로 기록
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+
+    header = json.dumps({
+                        'format': 1,
+                        'created_at': time.time(),
+                        'cell_degree': cell_degree,
+                        'count': start,
+                        'kinds': kinds,
+                        'kind_ranges': kind_ranges,
+                        'arrays': layout,
+                        }).encode('utf-8')
+    header += b' ' * (-len(header) % _ALIGN)
+
+    def write(f) -> None:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for array in arrays.values():
+            data = array.tobytes()
+            f.write(data)
+            f.write(b'\0' * (-len(data) % _ALIGN))
+
+    atomic_write(path, write, binary=True, fsync=True)
+
+
+class FacilitySnapshot:
+    """
+    snapshot 파일을 read-only mmap으로 열어서 배열을 복사 없이 사용
+    - 파일이 교체되어도 이미 연 mmap은 이전 파일(inode)을 계속 가리키므로 진행 중인 검색에 영향 없음
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}는 facility snapshot 파일이 아닙니다")
+
+        header_length, = _HEADER_LENGTH.unpack_from(self._mmap, len(MAGIC))
+        data_offset = len(MAGIC) + _HEADER_LENGTH.size + header_length
+        self.header = json.loads(self._mmap[len(MAGIC) + _HEADER_LENGTH.size:data_offset])
+
+        self.cell_degree = self.header['cell_degree']
+        self.created_at = self.header['created_at']
+        self.kinds = self.header['kinds']
+
+        self.arrays = {}
+        self._heap_offsets = {}
+        for name, spec in self.header['arrays'].items():
+            self.arrays[name] = np.frombuffer(self._mmap, dtype=np.dtype(spec['dtype']),
+                                              count=spec['length'], offset=data_offset + spec['offset'])
+            self._heap_offsets[name] = data_offset + spec['offset']
+
+    def __len__(self) -> int:
+        return self.header['count']
+
+    def _strings(self, column: str) -> StringColumn:
+        return StringColumn(self._mmap, self._heap_offsets[f'{column}_heap'],
+                            self.arrays[f'{column}_offsets'], self.arrays[f'{column}_nulls'])
+
+    def kind_columns(self, kind: str) -> Dict:
+        """
+        한 업종 구간의 배열들 (keys 순으로 정렬됨)
+        """
+        start, end = self.header['kind_ranges'][kind]
+        return {
+                'keys': self.arrays['keys'][start:end],
+                'lats': self.arrays['lats'][start:end],
+                'lons': self.arrays['lons'][start:end],
+                'names': self._strings('name').slice(start, end),
+                'addresses': self._strings('address').slice(start, end),
+                }
+
@@ -0,0 +1,82 @@
+import json
+import math
+import os
+import threading
+import time
+from typing import IO, Any, Callable, Optional, Tuple
+
+# 갱신 script(쓰는 쪽)와 uWSGI worker(읽는 쪽)가 파일로 주고받는 값
+## - 쓰는 쪽: 같은 폴더의 임시 파일에 다 쓴 뒤 os.replace로 교체해서 읽는 쪽이 반쯤 쓰인 파일을 보지 않도록 함
+## - 읽는 쪽: check_interval 마다 파일의 (inode, mtime)을 확인해서 바뀌었을 때만 다시 읽음
+
+
+def atomic_write(path: str, write: Callable[[IO], None], binary: bool = False, fsync: bool = False) -> None:
+    """
+    write(f)로 임시 파일을 채운 뒤 path로 교체
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb' if binary else 'w') as f:
+        write(f)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def atomic_write_json(path: str, obj: Any) -> None:
+    atomic_write(path, lambda f: json.dump(obj, f))
+
+def file_identity(path: str) -> Optional[Tuple[int, int]]:
+    """
+    파일 교체 여부 확인용 (inode, mtime) - 파일이 없으면 None
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class FileWatcher:
+    """
+    파일에서 읽은 값을 유지하고, check_interval 마다 파일이 바뀌었는지 확인해서 load(path)로 다시 읽음 (thread-safe)
+    - 처음 get() 할 때 읽고, 파일이 없거나 load가 None을 반환하면 이전 값(처음에는 default)을 그대로 사용
+    - 다른 thread가 확인 중이면 기다리지 않고 이전 값 반환
+    """
+
+    def __init__(self, path: str, load: Callable[[str], Any], check_interval: float, default: Any = None) -> None:
+        self.path = path
+        self.load = load
+        self.check_interval = check_interval
+        self.value = default
+
+        self._identity = None
+        self._checked_at = -math.inf
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval or not self._lock.acquire(blocking=False):
+            return self.value
+
+        try:
+            self._checked_at = now
+            identity = file_identity(self.path)
+            if identity is None or identity == self._identity:
+                return self.value
+
+            try:
+                value = self.load(self.path)
+            except (OSError, ValueError, KeyError) as e:
+                # 다음 주기에 다시 시도
+                print(f"{self.path} 다시 읽기 실패: {e}")
+                return self.value
+
+            self._identity = identity
+            if value is not None:
+                self.value = value
+        finally:
+            self._lock.release()
+
+        return self.value
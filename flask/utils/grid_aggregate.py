@@ -0,0 +1,179 @@
+import json
+import math
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from utils.db_connector import DBManagement
+from utils.facilities import FACILITY_CATEGORY_CODES, HASHTAG_KEYWORDS, facility_columns
+from utils.spatial_engine import bounding_box, haversine_meter
+from utils.unified_facility import CELL_DEGREE
+
+# 고정 격자(CELL_DEGREE) cell별 업종 개수, 키워드 개수
+## - 반경 안에 완전히 들어가는 cell은 이 table의 합으로 세고, 경계에 걸친 cell의 row만 통합 table에서 거리 계산
+## - 갱신 script가 업종 단위로 다시 만들고(rebuild_grid_counts), update_localdata는 바뀐 row만큼 증감(GridCountDelta)
+GRID_COUNT_TABLE = 'facility_grid_count'
+
+# cell 꼭짓점 거리 계산과 DB 거리 계산의 오차로 경계의 점이 잘못 분류되지 않도록 두는 여유 (m)
+CELL_MARGIN_METER = 1.0
+
+
+def create_grid_count_table(dbm: DBManagement) -> None:
+    dbm.cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {GRID_COUNT_TABLE}
+                    (
+                    category TINYINT UNSIGNED NOT NULL,
+                    cell_row INT NOT NULL,
+                    cell_col INT NOT NULL,
+                    count INT NOT NULL,
+                    keyword_count INT NOT NULL,
+                    PRIMARY KEY(category, cell_row, cell_col)
+                    );
+                    """)
+    dbm.commit()
+
+def keyword_column(facility: str, name_column: str) -> str:
+    keyword = HASHTAG_KEYWORDS.get(facility)
+    return f"REGEXP_LIKE({name_column}, '{keyword}', 'c')" if keyword else "0"
+
+def rebuild_grid_counts(dbm: DBManagement, facility: str) -> int:
+    """
+    업종별 table을 다시 적재한 뒤 호출 - 해당 업종의 cell별 개수를 모두 다시 계산 (한 transaction)
+    """
+    if facility not in FACILITY_CATEGORY_CODES:
+        print(f"{facility}는 격자 집계 대상 업종이 아닙니다.")
+        return 0
+
+    create_grid_count_table(dbm)
+
+    category = FACILITY_CATEGORY_CODES[facility]
+    name_column, _ = facility_columns(facility)
+
+    dbm.cursor.execute(f"DELETE FROM {GRID_COUNT_TABLE} WHERE category = {category}")
+    dbm.cursor.execute(f"""
+                    INSERT INTO {GRID_COUNT_TABLE} (category, cell_row, cell_col, count, keyword_count)
+                    SELECT {category}, cell_row, cell_col, COUNT(*), SUM(keyword)
+                    FROM (
+                        SELECT FLOOR(lat / {CELL_DEGREE}) AS cell_row, FLOOR(lon / {CELL_DEGREE}) AS cell_col,
+                               {keyword_column(facility, name_column)} AS keyword
+                        FROM {facility}
+                        WHERE lat IS NOT NULL AND lon IS NOT NULL
+                    ) AS cells
+                    GROUP BY cell_row, cell_col
+                    """)
+    cell_count = dbm.cursor.rowcount
+    dbm.commit()
+
+    print(f"격자 집계 table에 {facility} {cell_count}개 cell 반영")
+    return cell_count
+
+
+class GridCountDelta:
+    """
+    update_localdata에서 바뀌는 row의 cell별 개수 증감을 모았다가 한번에 반영
+    - 삭제/갱신 전 row는 -1, 갱신 후 row는 +1 (위치나 이름이 그대로면 서로 상쇄됨)
+    - keys는 delete_record와 같이 quote 처리된 (opnSfTeamCode, mgtNo, opnSvcId)
+    """
+
+    KEY_CHUNK = 200
+
+    def __init__(self, facility: str) -> None:
+        self.facility = facility
+        self.category = FACILITY_CATEGORY_CODES[facility]
+        self.name_column, _ = facility_columns(facility)
+        self.deltas: Dict[Tuple[int, int], List[int]] = {}
+
+    def _collect(self, dbm: DBManagement, keys: List[Tuple[str, str, str]], sign: int) -> None:
+        for start in range(0, len(keys), self.KEY_CHUNK):
+            key_list = ", ".join(f"({opnSfTeamCode}, {mgtNo}, {opnSvcId})"
+                                 for opnSfTeamCode, mgtNo, opnSvcId in keys[start:start + self.KEY_CHUNK])
+            dbm.cursor.execute(f"""
+                            SELECT FLOOR(lat / {CELL_DEGREE}), FLOOR(lon / {CELL_DEGREE}), {keyword_column(self.facility, self.name_column)}
+                            FROM {self.facility}
+                            WHERE (opnSfTeamCode, mgtNo, opnSvcId) IN ({key_list}) AND lat IS NOT NULL AND lon IS NOT NULL
+                            """)
+            for cell_row, cell_col, keyword in dbm.cursor.fetchall():
+                delta = self.deltas.setdefault((int(cell_row), int(cell_col)), [0, 0])
+                delta[0] += sign
+                delta[1] += sign * int(keyword or 0)
+
+    def remove(self, dbm: DBManagement, keys: List[Tuple[str, str, str]]) -> None:
+        self._collect(dbm, keys, -1)
+
+    def add(self, dbm: DBManagement, keys: List[Tuple[str, str, str]]) -> None:
+        self._collect(dbm, keys, 1)
+
+    def apply(self, dbm: DBManagement) -> int:
+        changed = [(cell_row, cell_col, count, keyword_count)
+                   for (cell_row, cell_col), (count, keyword_count) in self.deltas.items() if count or keyword_count]
+        if not changed:
+            return 0
+
+        create_grid_count_table(dbm)
+        for start in range(0, len(changed), self.KEY_CHUNK):
+            values = ", ".join(f"({self.category}, {cell_row}, {cell_col}, {count}, {keyword_count})"
+                               for cell_row, cell_col, count, keyword_count in changed[start:start + self.KEY_CHUNK])
+            dbm.cursor.execute(f"""
+                            INSERT INTO {GRID_COUNT_TABLE} (category, cell_row, cell_col, count, keyword_count)
+                            VALUES {values}
+                            ON DUPLICATE KEY UPDATE count = count + VALUES(count), keyword_count = keyword_count + VALUES(keyword_count)
+                            """)
+        dbm.cursor.execute(f"DELETE FROM {GRID_COUNT_TABLE} WHERE category = {self.category} AND count <= 0")
+        dbm.commit()
+
+        self.deltas = {}
+        return len(changed)
+
+
+# 반경 검색 cell 분류
+def cell_runs(rows: np.ndarray, cols: np.ndarray, mask: np.ndarray) -> List[List[int]]:
+    """
+    mask가 True인 cell들을 행마다 연속된 구간 [cell_row, col_from, col_to] 목록으로 압축
+    """
+    runs = []
+    for i, cell_row in enumerate(rows.tolist()):
+        selected = cols[mask[i]]
+        if len(selected) == 0:
+            continue
+        # 열 번호가 끊기는 곳에서 구간을 나눔
+        breaks = np.flatnonzero(np.diff(selected) > 1)
+        starts = np.concatenate(([0], breaks + 1))
+        ends = np.concatenate((breaks, [len(selected) - 1]))
+        runs.extend([cell_row, int(selected[s]), int(selected[e])] for s, e in zip(starts, ends))
+
+    return runs
+
+def classify_cells(lat: float, lon: float, radius_meter: float) -> Tuple[List[List[int]], List[List[int]]]:
+    """
+    반경 원을 감싸는 cell들을 (완전히 안에 있는 cell 구간, 원의 경계에 걸친 cell 구간)으로 나눔
+    - 완전히 안: 네 꼭짓점이 모두 radius - margin 안 (작은 cell에서는 원이 볼록하므로 cell 전체가 안에 있음)
+    - 경계: 완전히 안은 아니고, cell에서 중심과 가장 가까운 점이 radius + margin 안
+    """
+    min_lat, min_lon, max_lat, max_lon = bounding_box(lat, lon, radius_meter + CELL_MARGIN_METER)
+    rows = np.arange(math.floor(min_lat / CELL_DEGREE), math.floor(max_lat / CELL_DEGREE) + 1)
+    cols = np.arange(math.floor(min_lon / CELL_DEGREE), math.floor(max_lon / CELL_DEGREE) + 1)
+
+    # cell 경계선 위경도 (행/열 하나씩 더 많음)
+    edge_lats = np.append(rows, rows[-1] + 1) * CELL_DEGREE
+    edge_lons = np.append(cols, cols[-1] + 1) * CELL_DEGREE
+    corner_lats, corner_lons = np.meshgrid(edge_lats, edge_lons, indexing='ij')
+    corner_distance = haversine_meter(lat, lon, corner_lats, corner_lons)
+    farthest = np.maximum.reduce([corner_distance[:-1, :-1], corner_distance[1:, :-1],
+                                  corner_distance[:-1, 1:], corner_distance[1:, 1:]])
+
+    nearest_lats = np.clip(lat, edge_lats[:-1], edge_lats[1:])
+    nearest_lons = np.clip(lon, edge_lons[:-1], edge_lons[1:])
+    grid_lats, grid_lons = np.meshgrid(nearest_lats, nearest_lons, indexing='ij')
+    nearest = haversine_meter(lat, lon, grid_lats, grid_lons)
+
+    full = farthest < radius_meter - CELL_MARGIN_METER
+    boundary = ~full & (nearest <= radius_meter + CELL_MARGIN_METER)
+
+    return cell_runs(rows, cols, full), cell_runs(rows, cols, boundary)
+
+def category_cell_runs(facilities: Iterable[str], runs: List[List[int]]) -> str:
+    """
+    query parameter로 넘기는 JSON [[category, cell_row, col_from, col_to], ...]
+    """
+    return json.dumps([[FACILITY_CATEGORY_CODES[facility]] + run for facility in facilities for run in runs],
+                      separators=(',', ':'))
@@ -0,0 +1,234 @@
+import glob
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.facility_snapshot import FacilitySnapshot
+from utils.file_watch import FileWatcher, atomic_write, atomic_write_json
+from utils.score_weights import score_matrix
+from utils.spatial_engine import METER_PER_DEGREE
+from utils.unified_facility import CELL_DEGREE
+from utils import config
+
+# Score heatmap tile
+## - 갱신 script가 zoom마다 전체 tile sub-cell(tile 한 변 HEATMAP_TILE_GRID개) 중심에서 반경 안 업종별 개수를 미리 세어
+##   (세로 sub-cell, 가로 sub-cell, 업종) uint16 배열 하나(.npy)로 저장
+## - 업종 조합과 score 가중치는 요청마다 다르므로 score는 요청 시 tile 부분(grid x grid)만 계산
+## - 개수는 고정 격자(CELL_DEGREE) 단위로 세므로 반경 경계에서 cell 크기(약 100m)만큼 오차가 있음 (색 표시용)
+MANIFEST_NAME = 'manifest.json'
+
+# 한번에 누적합을 만드는 격자 행 개수 (메모리 사용량 제한)
+CHUNK_CELL_ROWS = 512
+
+
+# Web Mercator tile 좌표 (sub-cell 단위: 전체 폭 = 2^z * grid)
+def subcell_lons(z: int, grid: int, start: int, count: int) -> np.ndarray:
+    n = (1 << z) * grid
+    return (np.arange(start, start + count) + 0.5) / n * 360.0 - 180.0
+
+def subcell_lats(z: int, grid: int, start: int, count: int) -> np.ndarray:
+    n = (1 << z) * grid
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (np.arange(start, start + count) + 0.5) / n))))
+
+def tile_xy(z: int, lat: float, lon: float) -> Tuple[int, int]:
+    n = 1 << z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def radius_counts(rows: np.ndarray, cols: np.ndarray, sample_rows: np.ndarray, sample_cols: np.ndarray,
+                  radius_meter: float) -> np.ndarray:
+    """
+    격자 cell 번호로 나타낸 시설 위치(rows, cols: rows 순 정렬)에 대해, 표본 cell (sample_rows x sample_cols) 중심에서
+    반경 안에 중심이 있는 cell들의 시설 개수 -> (len(sample_rows), len(sample_cols))
+    - 행마다 열 방향 누적합을 만들고, 원의 행(dy)마다 [x - w, x + w] 구간 합을 더함 (w: 그 행에서 원의 반폭)
+    """
+    counts = np.zeros((len(sample_rows), len(sample_cols)), dtype=np.int32)
+    if len(rows) == 0 or len(sample_rows) == 0:
+        return counts
+
+    cell_meter = CELL_DEGREE * METER_PER_DEGREE
+    row_reach = int(radius_meter // cell_meter)
+    dys = np.arange(-row_reach, row_reach + 1)
+
+    # 열 번호를 0부터 시작하도록 옮김 (극에 가장 가까운 위도에서의 반경만큼 여유)
+    max_abs_lat = min(max(abs(int(rows.min())), abs(int(rows.max())), int(np.abs(sample_rows).max())) * CELL_DEGREE + 1.0, 89.0)
+    max_reach = int(radius_meter // (cell_meter * math.cos(math.radians(max_abs_lat)))) + 1
+    col0 = int(min(cols.min(), sample_cols.min())) - max_reach
+    width = int(max(cols.max(), sample_cols.max())) - col0 + max_reach + 1
+    local_cols = sample_cols - col0
+
+    order = np.argsort(sample_rows, kind='stable')
+    sorted_rows = sample_rows[order]
+
+    # 표본 행을 CHUNK_CELL_ROWS 범위씩 묶어서 처리
+    start = 0
+    while start < len(sorted_rows):
+        end = int(np.searchsorted(sorted_rows, sorted_rows[start] + CHUNK_CELL_ROWS, side='left'))
+        chunk_rows = sorted_rows[start:end]
+        base = int(chunk_rows[0]) - row_reach
+        height = int(chunk_rows[-1]) - base + row_reach + 1
+
+        lo, hi = np.searchsorted(rows, [base, base + height])
+        histogram = np.bincount((rows[lo:hi] - base) * width + (cols[lo:hi] - col0),
+                                minlength=height * width).reshape(height, width)
+        prefix = np.zeros((height, width + 1), dtype=np.int32)
+        np.cumsum(histogram, axis=1, out=prefix[:, 1:])
+
+        # 묶음 중간 위도 기준 경도 방향 cell 크기
+        col_meter = cell_meter * math.cos(math.radians((chunk_rows[len(chunk_rows) // 2] + 0.5) * CELL_DEGREE))
+        chunk_counts = np.zeros((len(chunk_rows), len(local_cols)), dtype=np.int32)
+        for dy in dys.tolist():
+            half_width = int(math.sqrt(max(radius_meter ** 2 - (dy * cell_meter) ** 2, 0.0)) // col_meter)
+            right = np.minimum(local_cols + half_width + 1, width)
+            left = np.maximum(local_cols - half_width, 0)
+            prefix_rows = prefix[chunk_rows - base + dy]
+            chunk_counts += prefix_rows[:, right] - prefix_rows[:, left]
+
+        counts[order[start:end]] = chunk_counts
+        start = end
+
+    return counts
+
+
+def export_heatmap_tiles(snapshot_path: str = None, heatmap_dir: str = None) -> Dict:
+    """
+    갱신 script에서 facility snapshot을 내보낸 뒤 호출 - snapshot의 위경도로 zoom별 개수 배열을 만들어 저장
+    - 새 배열을 다른 이름으로 쓴 뒤 manifest를 교체하므로, worker는 manifest가 가리키는 완전한 파일만 봄
+    """
+    snapshot_path = snapshot_path or config.FACILITY_SNAPSHOT_PATH
+    heatmap_dir = heatmap_dir or config.HEATMAP_DIR
+    zooms = [int(zoom) for zoom in config.HEATMAP_ZOOMS.split(',') if zoom.strip()]
+    grid = config.HEATMAP_TILE_GRID
+    radius_meter = config.HEATMAP_RADIUS_METER
+
+    snapshot = FacilitySnapshot(snapshot_path)
+    kinds = list(snapshot.kinds)
+
+    # 업종별 격자 cell 번호 (행 순 정렬)
+    points = {}
+    all_lats, all_lons = [], []
+    for kind in kinds:
+        columns = snapshot.kind_columns(kind)
+        lats, lons = np.asarray(columns['lats']), np.asarray(columns['lons'])
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        lats, lons = lats[valid], lons[valid]
+        rows, cols = np.floor(lats / CELL_DEGREE).astype(np.int64), np.floor(lons / CELL_DEGREE).astype(np.int64)
+        order = np.argsort(rows, kind='stable')
+        points[kind] = (rows[order], cols[order])
+        all_lats.append(lats)
+        all_lons.append(lons)
+
+    all_lats, all_lons = np.concatenate(all_lats), np.concatenate(all_lons)
+    if len(all_lats) == 0:
+        print("heatmap을 만들 시설 데이터가 없습니다.")
+        return {}
+
+    os.makedirs(heatmap_dir, exist_ok=True)
+    generation = time.strftime('%Y%m%d%H%M%S')
+    manifest = {
+                'created_at': time.time(),
+                'grid': grid,
+                'radius': radius_meter,
+                'kinds': kinds,
+                'zooms': {},
+                }
+
+    for z in zooms:
+        start = time.time()
+        # 데이터 범위를 덮는 tile 범위 (북서쪽 tile부터)
+        x0, y0 = tile_xy(z, float(all_lats.max()), float(all_lons.min()))
+        x1, y1 = tile_xy(z, float(all_lats.min()), float(all_lons.max()))
+        tiles_x, tiles_y = x1 - x0 + 1, y1 - y0 + 1
+
+        sample_rows = np.floor(subcell_lats(z, grid, y0 * grid, tiles_y * grid) / CELL_DEGREE).astype(np.int64)
+        sample_cols = np.floor(subcell_lons(z, grid, x0 * grid, tiles_x * grid) / CELL_DEGREE).astype(np.int64)
+
+        counts = np.empty((len(sample_rows), len(sample_cols), len(kinds)), dtype=np.uint16)
+        for i, kind in enumerate(kinds):
+            rows, cols = points[kind]
+            counts[:, :, i] = np.minimum(radius_counts(rows, cols, sample_rows, sample_cols, radius_meter),
+                                         np.iinfo(np.uint16).max)
+
+        file_name = f"counts_z{z}_{generation}.npy"
+        atomic_write(os.path.join(heatmap_dir, file_name), lambda f: np.save(f, counts), binary=True, fsync=True)
+
+        manifest['zooms'][str(z)] = {'file': file_name, 'x0': x0, 'y0': y0, 'tiles_x': tiles_x, 'tiles_y': tiles_y}
+        print(f"heatmap z{z} {tiles_x}x{tiles_y} tile 저장 ({time.time() - start:.1f}s)")
+
+    atomic_write_json(os.path.join(heatmap_dir, MANIFEST_NAME), manifest)
+
+    # 이전 generation 파일 정리 (이미 mmap으로 연 worker는 지워진 파일을 계속 사용할 수 있음)
+    current_files = {zoom['file'] for zoom in manifest['zooms'].values()}
+    for path in glob.glob(os.path.join(heatmap_dir, 'counts_z*.npy')):
+        if os.path.basename(path) not in current_files:
+            os.remove(path)
+
+    return manifest
+
+
+class HeatmapTiles:
+    """
+    manifest와 zoom별 개수 배열(read-only mmap)
+    """
+
+    def __init__(self, heatmap_dir: str) -> None:
+        with open(os.path.join(heatmap_dir, MANIFEST_NAME), 'r') as f:
+            self.manifest = json.load(f)
+
+        self.grid = self.manifest['grid']
+        self.radius = self.manifest['radius']
+        self.kind_index = {kind: i for i, kind in enumerate(self.manifest['kinds'])}
+        self.zooms = {int(z): zoom for z, zoom in self.manifest['zooms'].items()}
+        self.counts = {z: np.load(os.path.join(heatmap_dir, zoom['file']), mmap_mode='r') for z, zoom in self.zooms.items()}
+
+    def tile_counts(self, z: int, x: int, y: int, facilities_type: List[str]) -> Optional[np.ndarray]:
+        """
+        tile의 sub-cell별 업종 개수 (grid * grid, 업종 개수) - 만들지 않은 zoom이면 None, 데이터 범위 밖 tile은 0
+        """
+        zoom = self.zooms.get(z)
+        if zoom is None:
+            return None
+
+        counts = np.zeros((self.grid, self.grid, len(facilities_type)), dtype=np.float64)
+        tile_x, tile_y = x - zoom['x0'], y - zoom['y0']
+        if 0 <= tile_x < zoom['tiles_x'] and 0 <= tile_y < zoom['tiles_y']:
+            window = self.counts[z][tile_y * self.grid:(tile_y + 1) * self.grid, tile_x * self.grid:(tile_x + 1) * self.grid]
+            for i, facility in enumerate(facilities_type):
+                if facility in self.kind_index:
+                    counts[:, :, i] = window[:, :, self.kind_index[facility]]
+
+        return counts.reshape(self.grid * self.grid, len(facilities_type))
+
+    def tile_scores(self, z: int, x: int, y: int, facilities_type: List[str]) -> Optional[np.ndarray]:
+        """
+        tile의 sub-cell별 총 점수 (grid, grid) - calculate_scores와 같은 계산, 시설이 없는 sub-cell은 0
+        """
+        counts = self.tile_counts(z, x, y, facilities_type)
+        if counts is None:
+            return None
+
+        score_types = tuple(facility for facility in facilities_type if facility != 'metro')
+        if not score_types:
+            return np.zeros((self.grid, self.grid))
+
+        score_columns = [facilities_type.index(facility) for facility in score_types]
+        total_count = counts.sum(axis=1, keepdims=True)
+        individual_matrix = score_matrix(score_types, counts[:, score_columns], total_count)
+        total_score = np.round(np.nan_to_num(individual_matrix.sum(axis=1) / len(score_types)), 1)
+
+        return total_score.reshape(self.grid, self.grid)
+
+
+# worker에서 사용하는 현재 heatmap (manifest가 바뀌면 다시 엶)
+_watcher = FileWatcher(os.path.join(config.HEATMAP_DIR, MANIFEST_NAME),
+                       lambda manifest_path: HeatmapTiles(os.path.dirname(manifest_path)),
+                       config.HEATMAP_CHECK_SECONDS)
+
+def current_heatmap() -> Optional[HeatmapTiles]:
+    return _watcher.get()
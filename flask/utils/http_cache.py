@@ -0,0 +1,75 @@
+import functools
+import hashlib
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+from flask import Response, make_response, request
+
+from utils.data_version import current_data_version
+from utils.encoding import negotiate_format
+from utils.score_weights import current_score_weights
+from utils import config
+
+# HTTP cache (ETag / Cache-Control)
+## 응답은 (데이터 version, score 가중치 version, 정규화한 query, 응답 형식)이 같으면 같으므로 이걸로 ETag를 만들고,
+## If-None-Match가 맞으면 검색하지 않고 바로 304 - nginx uwsgi_cache도 같은 헤더로 cache/재검증함
+
+def normalized_query(response_format: str) -> str:
+    """
+    parameter 순서, facilities_type 순서/중복과 관계없이 같은 문자열
+    """
+    params = []
+    for key, value in request.args.items(multi=True):
+        if key == 'format':
+            continue
+        if key == 'facilities_type':
+            value = ','.join(sorted({facility.strip() for facility in value.split(',')}))
+        params.append((key, value))
+
+    return f"{request.path}?{urlencode(sorted(params))}|{response_format}"
+
+def response_etag(response_format: str) -> str:
+    digest = hashlib.sha1(normalized_query(response_format).encode('utf-8')).hexdigest()[:16]
+    return f"d{current_data_version()}-w{current_score_weights().version}-{digest}"
+
+def cacheable(view: Callable = None, max_age: Optional[int] = None) -> Callable:
+    """
+    GET 검색 endpoint용 - 200 응답에 weak ETag, Cache-Control을 붙이고 If-None-Match가 맞으면 304
+    - max_age: 이 endpoint의 Cache-Control max-age (없으면 HTTP_CACHE_MAX_AGE, 0이면 ETag/Cache-Control 없음)
+      200과 304에 같은 값을 붙이므로 view에서 Cache-Control max-age를 따로 정하지 않음
+    - view가 Cache-Control을 직접 정했으면 그대로 두고, no-store(DB 장애 시 stale 응답 등)면 ETag도 붙이지 않음
+    """
+    # @cacheable(max_age=...) 형태
+    if view is None:
+        return functools.partial(cacheable, max_age=max_age)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache_seconds = config.HTTP_CACHE_MAX_AGE if max_age is None else max_age
+        if cache_seconds <= 0:
+            return view(*args, **kwargs)
+
+        try:
+            response_format = negotiate_format(request)
+        except ValueError:
+            # 잘못된 format은 view에서 400으로 응답
+            return view(*args, **kwargs)
+
+        etag = response_etag(response_format)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = f'public, max-age={cache_seconds}'
+            response.vary.add('Accept')
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or 'no-store' in response.headers.get('Cache-Control', ''):
+            return response
+
+        response.set_etag(etag, weak=True)
+        response.headers.setdefault('Cache-Control', f'public, max-age={cache_seconds}')
+        response.vary.add('Accept')
+        return response
+
+    return wrapper
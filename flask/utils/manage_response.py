@@ -1,171 +1,526 @@
-import pandas as pd
 from typing import List, Dict, Tuple
-from utils.db_connector import DBManagement
+from utils.facilities import FACILITY_TYPES, HASHTAG_KEYWORDS
+from utils.rds_query import query_grid_counts, query_rds_rows, query_rds_rows_multi, query_rds_summary, query_rds_viewport, DB_UNAVAILABLE_ERRORS
+from utils.admission import request_deadline
+from utils.data_version import current_data_version
+from utils.spatial_engine import get_spatial_engine, haversine_meter
+from utils.response_cache import ResponseCache, InvalidationWatcher, geohash_encode, geohash_bounds
+from utils.score_weights import score_matrix
+from utils.single_flight import SingleFlight
+from utils import config, metrics
+import numpy as np
 import os
+import contextvars
 import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 current_file_path = os.path.abspath(__file__)
 root_path = os.path.dirname(os.path.dirname(current_file_path))
 
-# rds에서 주소에 대한 정보 가져오기
-def request_to_rds(facilities_type: List[str], lat: float, lon: float, radius_meter: int) -> List:
-
-    # Connect to RDS
-    path = os.path.join(root_path, "secret_key", "db_info.txt")
-    db_info_dict = DBManagement.get_db_info(path)
-    dbm = DBManagement(**db_info_dict)
-    print(f'성공적으로 MySQL {db_info_dict["database"]} 데이터베이스에 연결 완료')
-
-    # Make POINT type location based on EPSG4326 
-    location = f'ST_GeomFromText("POINT({lat} {lon})", 4326)'
-
-    # Query 저장
-    radius_query_list = []
-
-    for facility in facilities_type:
-        ## bus같은경우는 주소가 저장 안되어있으니 일단 NULL로 다 채우기
-        if facility == 'bus':
-            radius_query = f"""
-            SELECT StationName AS Name, '{facility}' AS Kind, ST_Distance_Sphere({location}, coordinates) AS distance, NULL AS address, lat, lon
-            FROM {facility}
-            WHERE ST_Contains(ST_Buffer({location}, {radius_meter}), coordinates) AND ST_Distance_Sphere({location}, coordinates) < {radius_meter}
-            """
-        elif facility == 'metro':
-            radius_query = f"""
-            SELECT StationName AS Name, '{facility}' AS Kind, ST_Distance_Sphere({location}, coordinates) AS distance, roadAddress AS address, lat, lon
-            FROM {facility}
-            WHERE ST_Contains(ST_Buffer({location}, {radius_meter}), coordinates) AND ST_Distance_Sphere({location}, coordinates) < {radius_meter}
-            """
+HASHTAG_PATTERNS = {kind: re.compile(pattern) for kind, pattern in HASHTAG_KEYWORDS.items()}
+
+# worker process 당 하나의 response cache
+response_cache = ResponseCache(max_entries=config.RESPONSE_CACHE_MAX_ENTRIES, ttl=config.RESPONSE_CACHE_TTL)
+invalidation_watcher = InvalidationWatcher(response_cache, config.CACHE_INVALIDATION_PATH,
+                                           check_interval=config.CACHE_INVALIDATION_CHECK_SECONDS)
+
+def cache_stats() -> Dict:
+    return response_cache.stats()
+
+# 같은 검색이 동시에 들어오면 한번만 실행 (worker process 당 하나)
+## coalesced: 다른 요청의 실행 결과를 받아서 절약한 검색 횟수
+single_flight = SingleFlight()
+
+def single_flight_stats() -> Dict:
+    return single_flight.stats()
+
+# DB 장애 시 대신 응답할 마지막 정상 결과 (worker process 당 하나)
+## key: (업종 tuple, 반경, mode, k, geohash) - 가까운 좌표(같은 geohash cell)의 결과를 같이 사용
+stale_cache = ResponseCache(max_entries=config.STALE_CACHE_MAX_ENTRIES, ttl=config.STALE_CACHE_TTL)
+
+class StaleResponseList(list):
+    """
+    stale_cache에서 꺼낸 결과 - 응답에 stale 표시용
+    """
+    stale = True
+
+# stale로 응답한 검색들 - DB가 복구되면 background에서 다시 조회해서 stale_cache 갱신
+_stale_pending = OrderedDict()
+_stale_lock = threading.Lock()
+_stale_refreshing = False
+_stale_stats = {'served': 0, 'refreshed': 0}
+
+def stale_stats() -> Dict:
+    with _stale_lock:
+        stats = dict(_stale_stats)
+        stats['pending'] = len(_stale_pending)
+    stats['entries'] = stale_cache.stats()['entries']
+
+    return stats
+
+# 여러 위치를 동시에 검색하기 위한 thread pool (worker process 당 하나)
+_lookup_executor = None
+_lookup_executor_pid = None
+_lookup_executor_lock = threading.Lock()
+
+def get_lookup_executor() -> ThreadPoolExecutor:
+    global _lookup_executor, _lookup_executor_pid
+
+    pid = os.getpid()
+    if _lookup_executor is None or _lookup_executor_pid != pid:
+        with _lookup_executor_lock:
+            if _lookup_executor is None or _lookup_executor_pid != pid:
+                _lookup_executor = ThreadPoolExecutor(max_workers=config.LOOKUP_THREADS)
+                _lookup_executor_pid = pid
+
+    return _lookup_executor
+
+# 여러 위치의 search_facilities 결과 (첫 위치는 현재 thread, 나머지는 thread pool에서 동시에 수행)
+def search_locations(facilities_type: List[str], locations: List[Tuple[float, float]], radius_meter: int,
+                     mode: str = 'full', k: int = None) -> List[List]:
+    executor = get_lookup_executor()
+    # metrics label 등 현재 요청의 context를 thread pool에서도 사용하도록 복사해서 넘김
+    futures = [executor.submit(contextvars.copy_context().run, search_facilities, facilities_type, lat, lon, radius_meter, mode, k)
+               for lat, lon in locations[1:]]
+
+    lat, lon = locations[0]
+    response_lists = [search_facilities(facilities_type, lat, lon, radius_meter, mode, k)]
+    response_lists.extend(future.result() for future in futures)
+
+    return response_lists
+
+# 여러 위치를 묶어서(chunk 단위 grouped query) 검색 - chunk_points의 위치별 결과
+## /db_check_batch는 chunk마다 호출해서 끝나는 대로 전송하고, 실패한 chunk는 위치별 에러로 응답
+def search_batch_chunk(facilities_type: List[str], chunk_points: List[Tuple[float, float]], radius_meter: int,
+                       mode: str = 'full', k: int = None) -> List[List]:
+    # deadline은 chunk(grouped query) 단위로 적용
+    with request_deadline():
+        if mode == 'count' and use_grid_counts():
+            summaries = [query_grid_counts(facilities_type, lat, lon, radius_meter) for lat, lon in chunk_points]
+        elif config.RESPONSE_CACHE_ENABLED:
+            rows_list = cached_query_rows_multi(facilities_type, chunk_points, radius_meter)
         else:
-            radius_query = f"""
-            SELECT bplcNm AS Name, '{facility}' AS Kind, ST_Distance_Sphere({location}, coordinates) AS distance, rdnWhlAddr AS address, lat, lon
-            FROM {facility}
-            WHERE ST_Contains(ST_Buffer({location}, {radius_meter}), coordinates) AND ST_Distance_Sphere({location}, coordinates) < {radius_meter}
-            """
-        
-        radius_query_list.append(radius_query)
+            rows_list = query_rows_multi(facilities_type, [(lat, lon, radius_meter) for lat, lon in chunk_points])
+
+    if mode == 'count' and use_grid_counts():
+        return [make_summary_response_list(facilities_type, summary, []) for summary in summaries]
+    return [make_response_list_by_mode(facilities_type, rows, mode, k) for rows in rows_list]
+
+# 반경 검색 후 [total_count, facility_body, hashtag_list] 반환
+## 결과는 동시에 들어온 같은 요청들이 공유하므로 수정하지 말 것
+## DB를 사용할 수 없으면 같은 geohash cell의 마지막 정상 결과를 StaleResponseList로 반환 (없으면 에러 그대로)
+def search_facilities(facilities_type: List[str], lat: float, lon: float, radius_meter: int,
+                      mode: str = 'full', k: int = None) -> List:
+    if not config.STALE_CACHE_ENABLED or config.SERVING_BACKEND != 'rds':
+        return _coalesced_search(facilities_type, lat, lon, radius_meter, mode, k)
+
+    search_args = (facilities_type, lat, lon, radius_meter, mode, k)
+    # 업종 순서/중복과 관계없이 같은 key (response_cache_key, ETag와 같은 정규화)
+    key = (tuple(sorted(set(facilities_type))), radius_meter, mode, k, geohash_encode(lat, lon, config.STALE_CACHE_GEOHASH_PRECISION))
+    try:
+        response_list = _coalesced_search(*search_args)
+    except DB_UNAVAILABLE_ERRORS:
+        stale_response_list = get_stale_response(key, search_args)
+        if stale_response_list is None:
+            raise
+        return stale_response_list
+
+    stale_cache.put(key, response_list)
+    if _stale_pending and not _stale_refreshing:
+        start_stale_refresh()
+
+    return response_list
+
+def _coalesced_search(facilities_type: List[str], lat: float, lon: float, radius_meter: int,
+                      mode: str = 'full', k: int = None) -> List:
+    if not config.SINGLE_FLIGHT_ENABLED:
+        return _search_facilities(facilities_type, lat, lon, radius_meter, mode, k)
+
+    # 업종 순서/중복만 다른 요청도 같은 key (결과의 업종 순서는 먼저 들어온 요청을 따름)
+    key = ('search', tuple(sorted(set(facilities_type))), float(lat), float(lon), radius_meter, mode, k)
+    return single_flight.do(key, _search_facilities, facilities_type, lat, lon, radius_meter, mode, k)
+
+def get_stale_response(key: Tuple, search_args: Tuple) -> StaleResponseList:
+    response_list = stale_cache.get(key)
+    if response_list is None:
+        return None
+
+    with _stale_lock:
+        _stale_stats['served'] += 1
+        _stale_pending[key] = search_args
+        _stale_pending.move_to_end(key)
+        while len(_stale_pending) > config.STALE_REFRESH_MAX_PENDING:
+            _stale_pending.popitem(last=False)
+
+    return StaleResponseList(response_list)
+
+# 복구 후 첫 정상 응답에서 시작 - 다시 실패하면 멈추고 다음 정상 응답 때 이어서 갱신
+def start_stale_refresh() -> None:
+    global _stale_refreshing
+
+    with _stale_lock:
+        if _stale_refreshing:
+            return
+        _stale_refreshing = True
+    threading.Thread(target=_refresh_stale_responses, daemon=True).start()
+
+def _refresh_stale_responses() -> None:
+    global _stale_refreshing
+
+    try:
+        while True:
+            with _stale_lock:
+                if not _stale_pending:
+                    return
+                key, search_args = _stale_pending.popitem(last=False)
+
+            try:
+                response_list = _search_facilities(*search_args)
+            except DB_UNAVAILABLE_ERRORS:
+                with _stale_lock:
+                    _stale_pending[key] = search_args
+                return
+
+            stale_cache.put(key, response_list)
+            with _stale_lock:
+                _stale_stats['refreshed'] += 1
+    finally:
+        _stale_refreshing = False
+
+def _search_facilities(facilities_type: List[str], lat: float, lon: float, radius_meter: int,
+                       mode: str = 'full', k: int = None) -> List:
+
+    # count는 격자 집계 table로 계산 (경계 cell의 row만 읽음)
+    if mode == 'count' and use_grid_counts():
+        return make_summary_response_list(facilities_type, query_grid_counts(facilities_type, lat, lon, radius_meter), [])
+
+    # count, top_k는 rds backend에서 집계까지 DB에서 처리 (row 전송 최소화)
+    ## cache에 이미 후보 row가 있으면 그걸로 계산하고, 없으면 후보 row 전체 대신 집계 결과만 가져옴 (cache는 채우지 않음)
+    if mode != 'full' and config.SERVING_BACKEND == 'rds':
+        if config.RESPONSE_CACHE_ENABLED:
+            cached_rows = peek_cached_rows(facilities_type, lat, lon, radius_meter)
+            if cached_rows is not None:
+                return make_response_list_by_mode(facilities_type, cached_rows, mode, k)
+
+        summary, places = query_rds_summary(facilities_type, lat, lon, radius_meter, k if mode == 'top_k' else 0)
+        return make_summary_response_list(facilities_type, summary, places)
+
+    if config.RESPONSE_CACHE_ENABLED:
+        query_result = cached_query_rows(facilities_type, lat, lon, radius_meter)
+    else:
+        query_result = query_rows(facilities_type, lat, lon, radius_meter)
+
+    return make_response_list_by_mode(facilities_type, query_result, mode, k)
+
+def use_grid_counts() -> bool:
+    return bool(config.GRID_COUNT_ENABLED) and config.SERVING_BACKEND == 'rds'
+
+# 업종별 가까운 k개 - k_by_facility: {업종: k}
+## 작은 반경부터 검색해서 k개가 안 채워진 업종만 반경을 넓혀 다시 검색
+## - 반경 안에서 k개를 찾았으면 반경 밖의 시설은 모두 더 멀기 때문에 그 k개가 전체에서 가장 가까운 k개
+## - KNN_MAX_RADIUS 까지 넓혀도 k개가 안 되면 찾은 만큼만 반환
+def search_nearest(k_by_facility: Dict[str, int], lat: float, lon: float) -> Dict[str, Dict]:
+    max_radius = config.KNN_MAX_RADIUS
+    radius_meter = min(config.KNN_START_RADIUS, max_radius)
+    remaining = list(k_by_facility)
+    nearest_body = {}
+
+    while remaining:
+        k = max(k_by_facility[facility] for facility in remaining)
+        found = {facility: [] for facility in remaining}
+        for row in query_nearest_rows(remaining, lat, lon, radius_meter, k):
+            found[row[1]].append(row)
+
+        for facility in list(remaining):
+            if len(found[facility]) >= k_by_facility[facility] or radius_meter >= max_radius:
+                places = found[facility][:k_by_facility[facility]]
+                nearest_body[facility] = {'count': len(places), 'radius': radius_meter, 'place': [place_dict(row) for row in places]}
+                remaining.remove(facility)
+
+        # KNN_RADIUS_GROWTH가 1 이하로 설정되어도 반경이 매번 늘어나서 KNN_MAX_RADIUS에서 끝나도록 함
+        radius_meter = min(max(radius_meter * config.KNN_RADIUS_GROWTH, radius_meter + 1), max_radius)
+
+    return {facility: nearest_body[facility] for facility in k_by_facility}
+
+# 반경 안에서 업종별 가까운 k개 row (거리순)
+def query_nearest_rows(facilities_type: List[str], lat: float, lon: float, radius_meter: float, k: int) -> List[Tuple]:
+    if config.SERVING_BACKEND == 'memory':
+        return nearest_rows(get_spatial_engine().query(facilities_type, lat, lon, radius_meter), k)
+
+    _, places = query_rds_summary(facilities_type, lat, lon, radius_meter, k)
+    return places
+
+# 사각형(viewport) 안의 시설 한 page - (places, 다음 page cursor 또는 None)
+## cursor는 "data version:category:key" (key는 이전 page 마지막 시설의 rds 통합 table id, memory는 index 위치)
+## 갱신 script가 통합 table/snapshot을 다시 채우면 id와 index 위치가 바뀌므로, data version이 다른 cursor는 거절
+def search_viewport(facilities_type: List[str], box: Tuple[float, float, float, float], cursor: str = None,
+                    limit: int = None) -> Tuple[List[Dict], str]:
+    limit = limit or config.VIEWPORT_PAGE_SIZE
+    version = current_data_version()
+    after = parse_viewport_cursor(cursor, version)
+
+    # 다음 page가 있는지 알기 위해 하나 더 가져옴
+    if config.SERVING_BACKEND == 'memory':
+        rows = get_spatial_engine().viewport(facilities_type, box, after, limit + 1)
+    else:
+        rows = query_rds_viewport(facilities_type, box, after, limit + 1)
+
+    with metrics.timer('build_body'):
+        places = [{'kind': FACILITY_TYPES[row[0]],
+                   'name': row[2],
+                   'address': row[3],
+                   'lat': row[4],
+                   'lon': row[5]
+                   } for row in rows[:limit]]
+
+    next_cursor = f"{version}:{rows[limit - 1][0]}:{rows[limit - 1][1]}" if len(rows) > limit else None
+    return places, next_cursor
+
+def parse_viewport_cursor(cursor: str, version: int) -> Tuple[int, int]:
+    if not cursor:
+        return -1, -1
+    try:
+        cursor_version, category, key = (int(value) for value in cursor.split(':'))
+    except ValueError:
+        raise ValueError('cursor 형식이 올바르지 않습니다.')
 
-    radius_query = " UNION ALL".join(radius_query_list) + "ORDER BY distance;"
+    if cursor_version != version:
+        raise ValueError('데이터가 갱신되어 cursor가 만료되었습니다. cursor 없이 처음 page부터 다시 요청하세요.')
+    return category, key
 
-    # execute
-    dbm.cursor.execute(radius_query)
-    query_result = dbm.cursor.fetchall()
+# 검색 backend 선택 (config.SERVING_BACKEND: 'rds' | 'memory')
+def query_rows(facilities_type: List[str], lat: float, lon: float, radius_meter: float) -> List[Tuple]:
+    return query_rows_multi(facilities_type, [(lat, lon, radius_meter)])[0]
+
+# queries: [(lat, lon, radius_meter), ...] - 위치별 row 리스트 반환
+def query_rows_multi(facilities_type: List[str], queries: List[Tuple[float, float, float]]) -> List[List[Tuple]]:
+    if config.SERVING_BACKEND == 'memory':
+        engine = get_spatial_engine()
+        with metrics.timer('memory_query'):
+            return [engine.query(facilities_type, lat, lon, radius_meter) for lat, lon, radius_meter in queries]
+
+    if len(queries) == 1:
+        return [query_rds_rows(facilities_type, *queries[0])]
+    return query_rds_rows_multi(facilities_type, queries)
+
+# geohash cell 전체를 덮는 후보 집합을 cache하고, 요청 좌표 기준으로 거리를 다시 계산
+def cached_query_rows(facilities_type: List[str], lat: float, lon: float, radius_meter: int) -> List[Tuple]:
+    return cached_query_rows_multi(facilities_type, [(lat, lon)], radius_meter)[0]
+
+def response_cache_key(facilities_type: List[str], lat: float, lon: float, radius_meter: int) -> Tuple:
+    return (tuple(sorted(set(facilities_type))), radius_meter, geohash_encode(lat, lon, config.RESPONSE_CACHE_GEOHASH_PRECISION))
+
+# cache에 있을 때만 후보 집합으로 계산한 row (없으면 None, DB 조회하지 않음)
+def peek_cached_rows(facilities_type: List[str], lat: float, lon: float, radius_meter: int) -> List[Tuple]:
+    invalidation_watcher.check()
+
+    candidates = response_cache.get(response_cache_key(facilities_type, lat, lon, radius_meter))
+    if candidates is None:
+        return None
+
+    with metrics.timer('refilter'):
+        return refilter_rows(candidates, lat, lon, radius_meter)
+
+def cached_query_rows_multi(facilities_type: List[str], points: List[Tuple[float, float]], radius_meter: int) -> List[List[Tuple]]:
+    invalidation_watcher.check()
+
+    facilities_key = tuple(sorted(set(facilities_type)))
+    keys = [response_cache_key(facilities_key, lat, lon, radius_meter) for lat, lon in points]
+
+    candidates_dict = {}
+    for key in keys:
+        if key not in candidates_dict:
+            candidates_dict[key] = response_cache.get(key)
+
+    # cache에 없는 cell들은 한번에 조회
+    missing_keys = [key for key, candidates in candidates_dict.items() if candidates is None]
+    if missing_keys:
+        queries = [cell_query(key[2], radius_meter) for key in missing_keys]
+        for key, rows in zip(missing_keys, query_rows_multi(list(facilities_key), queries)):
+            candidates = (rows,
+                          np.array([row[4] for row in rows], dtype=np.float64),
+                          np.array([row[5] for row in rows], dtype=np.float64))
+            response_cache.put(key, candidates)
+            candidates_dict[key] = candidates
+
+    with metrics.timer('refilter'):
+        return [refilter_rows(candidates_dict[key], lat, lon, radius_meter) for key, (lat, lon) in zip(keys, points)]
+
+# cell 중심에서 (반경 + 중심~꼭짓점 거리)로 검색하면 cell 안의 어떤 좌표에 대해서도 누락이 없음
+def cell_query(geohash: str, radius_meter: int) -> Tuple[float, float, float]:
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(geohash)
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    half_diagonal = haversine_meter(center_lat, center_lon,
+                                    np.array([min_lat, min_lat, max_lat, max_lat]),
+                                    np.array([min_lon, max_lon, min_lon, max_lon])).max()
+
+    return center_lat, center_lon, radius_meter + math.ceil(half_diagonal) + 1
+
+# 후보 row들 중 실제 반경 안의 row만 거리순으로 반환 (distance는 요청 좌표 기준으로 교체)
+def refilter_rows(candidates: Tuple, lat: float, lon: float, radius_meter: int) -> List[Tuple]:
+    rows, lats, lons = candidates
+    if not rows:
+        return []
+
+    distance = haversine_meter(lat, lon, lats, lons)
+    inside = np.flatnonzero(distance < radius_meter)
+    order = inside[np.argsort(distance[inside], kind='stable')].tolist()
+    distance = distance.tolist()
+
+    return [(rows[i][0], rows[i][1], distance[i], rows[i][3], rows[i][4], rows[i][5]) for i in order]
+
+# 검색 결과 row들을 [total_count, facility_body, hashtag_list] 형태로 변환
+## 업종별로 묶으면서 hashtag 키워드도 함께 확인 (업종마다 처음 일치하는 이름이 나오면 더 검사하지 않음)
+# row: (name, kind, distance, address, lat, lon)
+def place_dict(row: Tuple) -> Dict:
+    return {'name': row[0],
+            'distance':int(row[2]),
+            'address': row[3],
+            'lat': row[4],
+            'lon': row[5]
+            }
+
+def make_response_list(facilities_type: List[str], query_result: List[Tuple]) -> List:
     total_count = len(query_result)
 
-    facility_body = {facility : {"count": 0, "place": []} for facility in facilities_type}
-    
-    for row in query_result:
-        kind = row[1]
-        facility_body[kind]['place'].append(
-                                            {'name': row[0],
-                                            'distance':int(row[2]),
-                                            'address': row[3],
-                                            'lat': row[4],
-                                            'lon': row[5]
-                                            })
-        facility_body[kind]['count'] += 1
-
-    hashtag_list = find_hashtag(facility_body)
+    with metrics.timer('build_body'):
+        facility_body = {facility : {"count": 0, "place": []} for facility in facilities_type}
+        keyword_found = set()
+        
+        for row in query_result:
+            kind = row[1]
+            facility_body[kind]['place'].append(place_dict(row))
+            facility_body[kind]['count'] += 1
+
+            if kind not in keyword_found and has_hashtag_keyword(kind, row[0]):
+                keyword_found.add(kind)
+
+    with metrics.timer('hashtag'):
+        summary = {facility: (body['count'], int(facility in keyword_found)) for facility, body in facility_body.items()}
+        hashtag_list = find_hashtag_from_summary(summary)
     response_list = [total_count, facility_body, hashtag_list]
 
     return response_list
 
-def initialize_dataframe(data_dict: dict, key: str) -> pd.DataFrame:
-    try:
-        dataframe = pd.DataFrame(data_dict[key]['place'])
-    except:
-        dataframe = pd.DataFrame()
-    
-    return dataframe
+# 응답 형태 - full: 모든 장소, count: 업종별 개수만, top_k: 업종별 가까운 k개 장소 + 전체 개수
+RESPONSE_MODES = ('full', 'count', 'top_k')
 
-def find_hashtag(location_dict: dict ) -> List[str]:
+def make_response_list_by_mode(facilities_type: List[str], query_result: List[Tuple], mode: str = 'full', k: int = None) -> List:
+    if mode == 'full':
+        return make_response_list(facilities_type, query_result)
 
-    hashtag_list = []
+    summary = summarize_rows(facilities_type, query_result)
+    places = [] if mode == 'count' else nearest_rows(query_result, k)
+    return make_summary_response_list(facilities_type, summary, places)
 
-    # 데이터 초기화
-    dataframes = {}
-    categories = ['hospital', 'pharmacy', 'laundry', 'hair', 'gym', 'mart', 'convenience', 'cafe', 'bus', 'metro']
+# 거리순 row들에서 업종별 앞의 k개만
+def nearest_rows(query_result: List[Tuple], k: int) -> List[Tuple]:
+    kind_count = {}
+    places = []
+    for row in query_result:
+        kind = row[1]
+        if kind_count.get(kind, 0) < k:
+            kind_count[kind] = kind_count.get(kind, 0) + 1
+            places.append(row)
+
+    return places
+
+# 업종별 (개수, hashtag 키워드에 해당하는 이름 개수)
+def summarize_rows(facilities_type: List[str], query_result: List[Tuple]) -> Dict[str, Tuple[int, int]]:
+    counts = {facility: 0 for facility in facilities_type}
+    keyword_counts = {facility: 0 for facility in facilities_type}
+
+    for row in query_result:
+        kind = row[1]
+        counts[kind] += 1
+        if has_hashtag_keyword(kind, row[0]):
+            keyword_counts[kind] += 1
+
+    return {facility: (counts[facility], keyword_counts[facility]) for facility in facilities_type}
 
-    for category in categories:
-        dataframes[category] = initialize_dataframe(location_dict, category)
+# 이름이 업종의 hashtag 키워드에 해당하는지 (이름이 문자열이 아니면 False)
+def has_hashtag_keyword(kind: str, name) -> bool:
+    pattern = HASHTAG_PATTERNS.get(kind)
+    return pattern is not None and isinstance(name, str) and pattern.search(name) is not None
 
-    
-    # 헬스장
-    if not dataframes['gym'].empty and dataframes['gym']['name'].str.contains('헬스|짐|gym|피트니스|휘트니스|fitness|PT|피티', regex=True).any():
+# summary: {kind: (count, keyword_count)}, places: 응답에 포함할 row들
+def make_summary_response_list(facilities_type: List[str], summary: Dict[str, Tuple[int, int]], places: List[Tuple]) -> List:
+    with metrics.timer('build_body'):
+        facility_body = {facility : {"count": summary.get(facility, (0, 0))[0], "place": []} for facility in facilities_type}
+
+        for row in places:
+            facility_body[row[1]]['place'].append(place_dict(row))
+
+        total_count = sum(body['count'] for body in facility_body.values())
+
+    with metrics.timer('hashtag'):
+        hashtag_list = find_hashtag_from_summary(summary)
+    return [total_count, facility_body, hashtag_list]
+
+# 개수와 키워드 개수만으로 find_hashtag와 같은 hashtag 계산
+def find_hashtag_from_summary(summary: Dict[str, Tuple[int, int]]) -> List[str]:
+    count = lambda kind: summary.get(kind, (0, 0))[0]
+    keyword_count = lambda kind: summary.get(kind, (0, 0))[1]
+
+    hashtag_list = []
+    if keyword_count('gym') > 0:
         hashtag_list.append("#헬스장")
-        
-    # 코인빨래방
-    if not dataframes['laundry'].empty and dataframes['laundry']['name'].str.contains('코인|크린토피아|셀프|24', regex=True).any():
+    if keyword_count('laundry') > 0:
         hashtag_list.append("#코인빨래방")
-    
-    #대형쇼핑몰
-    if len(dataframes['mart']) >= 1:
+    if count('mart') >= 1:
         hashtag_list.append("#마트/쇼핑몰")
-    
-    #편세권
-    if len(dataframes['convenience']) >= 3:
+    if count('convenience') >= 3:
         hashtag_list.append("#편세권")
-    
-    # 스세권
-    if not dataframes['cafe'].empty and dataframes['cafe']['name'].str.contains('스타벅스', regex=True).any():
+    if keyword_count('cafe') > 0:
         hashtag_list.append("#스세권")
-        
-    # 역세권
-    if len(dataframes['metro']) >= 3:
+    if count('metro') >= 3:
         hashtag_list.append("#초역세권")
-    elif len(dataframes['metro']) >= 1:
+    elif count('metro') >= 1:
         hashtag_list.append('#역세권')
-        
-        
+
     return hashtag_list
 
-def calculate_score(facilities_type: List[str], total_count: int, facility_body: pd.DataFrame) ->Tuple[Dict, float]:
-
-    # 가중치로 활용하기 위한 각 업종별 전체 데이터 개수(나중에 자동화 하기)
-    weight = {
-            'bus': 200000,
-            'cafe': 51000,
-            'convenience': 52000,
-            'gym': 35000,
-            'hair': 180000,
-            'hospital': 70000,
-            'mart':2700,
-            'laundry': 20000,
-            'pharmacy': 24000
-            }
-    
-    # 지하철은 제외
-    if 'metro' in facilities_type:
-        facilities_type.remove('metro')
-
-
-    weight_series = pd.Series(weight)
-
-    cnt_series = pd.Series( {type: facility_body[type]['count'] for type in facilities_type} )
-    print('count')
-    print(cnt_series)
-    
-    # 전체 중 비율 고려한 수치 (30%)
-    rate_series = (cnt_series / total_count * 100) * 0.3
-    print('비율')
-    print(rate_series)
-
-    import numpy as np
-    # 가중치 고려한 보정 개수 수치 (70%)
-    weighted_cnt_series = (cnt_series * ( sum(weight_series) / weight_series[facilities_type] )) * 0.7
-    weighted_cnt_series = weighted_cnt_series.apply(lambda x: np.log(x) / np.log(2) if x > 1 else 0)
-    print('가중치')
-    print(weighted_cnt_series)
+# facility_body(make_response_list 결과)로 hashtag 계산
+def find_hashtag(location_dict: dict ) -> List[str]:
+    summary = {}
+    for kind, body in location_dict.items():
+        places = body.get('place', [])
+        keyword_found = any(has_hashtag_keyword(kind, place.get('name')) for place in places)
+        summary[kind] = (len(places), int(keyword_found))
 
-    # 개별 score - 소수 첫째자리까지 반올림
-    individual_score = dict(round(rate_series + weighted_cnt_series, 1))
-    # 총 점수 = 평균 - 소수 첫째자리까지 반올림
-    total_score = round(sum(individual_score.values()) / len(facilities_type), 1)
-    print('total')
-    print(individual_score)
-    print('-'* 30)
+    return find_hashtag_from_summary(summary)
+
+# 위치 하나의 score (calculate_scores와 같은 계산, facilities_type은 변경하지 않음)
+def calculate_score(facilities_type: List[str], total_count: int, facility_body: Dict) -> Tuple[Dict, float]:
+    return calculate_scores(facilities_type, [(total_count, facility_body)])[0]
+
+# 여러 위치의 score를 한번에 계산
+## locations: [(total_count, facility_body), ...]
+def calculate_scores(facilities_type: List[str], locations: List[Tuple[int, Dict]]) -> List[Tuple[Dict, float]]:
+
+    # 지하철은 제외 - 지하철만 검색했으면 score 없음
+    score_types = tuple(facility for facility in facilities_type if facility != 'metro')
+    if not score_types:
+        return [({}, None) for _ in locations]
 
+    # (위치 개수, 업종 개수) 행렬
+    cnt_matrix = np.array([[facility_body[facility]['count'] for facility in score_types]
+                           for _, facility_body in locations], dtype=np.float64).reshape(len(locations), len(score_types))
+    total_count = np.array([total for total, _ in locations], dtype=np.float64)[:, None]
 
+    # 개별 score - 소수 첫째자리까지 반올림
+    individual_matrix = score_matrix(score_types, cnt_matrix, total_count)
+
+    # 총 점수 = 평균 - 소수 첫째자리까지 반올림
+    total_scores = np.round(individual_matrix.sum(axis=1) / len(score_types), 1)
 
-    return individual_score, total_score
+    # 검색된 시설이 없는 위치는 NaN (0 / 0) -> None (JSON null)
+    result = []
+    for scores, total_score in zip(individual_matrix.tolist(), total_scores.tolist()):
+        individual_score = {facility: None if math.isnan(score) else score for facility, score in zip(score_types, scores)}
+        result.append((individual_score, None if math.isnan(total_score) else total_score))
 
+    return result
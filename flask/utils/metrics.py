@@ -0,0 +1,223 @@
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+from utils.facilities import FACILITY_TYPES
+from utils.file_watch import atomic_write_json
+from utils import config
+
+# 단계별 소요시간 histogram bucket (seconds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 현재 요청의 (endpoint, 업종 개수) - thread pool로 넘길 때는 contextvars.copy_context() 사용
+## 업종 조합을 label로 쓰면 series 개수가 조합 수만큼 늘어나므로 whitelist에 있는 업종의 개수만 사용
+_labels = contextvars.ContextVar('metrics_labels', default=('', ''))
+
+
+class StageHistograms:
+    """
+    (endpoint, facility_count, stage) 별 소요시간 histogram (thread-safe)
+    - bucket 개수는 누적이 아닌 구간별로 저장하고, 출력할 때 누적으로 변환
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        # key -> [구간별 개수 ... (+Inf 포함), 합계]
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            values = self._data.get(key)
+            if values is None:
+                values = self._data[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += seconds
+
+    def snapshot(self) -> Dict[str, list]:
+        with self._lock:
+            return {key: list(values) for key, values in self._data.items()}
+
+
+histograms = StageHistograms()
+
+# 출력할 때마다 값을 읽어오는 gauge (name -> callback() -> {stat: value})
+_gauges: Dict[str, Callable[[], Dict]] = {}
+
+_flushed_at = 0.0
+_flush_lock = threading.Lock()
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        observe(self.stage, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage: str):
+    """
+    with metrics.timer('sql'): ...  - METRICS_ENABLED=0이면 아무것도 하지 않음
+    """
+    if not config.METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+def observe(stage: str, seconds: float) -> None:
+    endpoint, facility_count = _labels.get()
+    histograms.observe(f"{endpoint}|{facility_count}|{stage}", seconds)
+
+    if config.METRICS_DIR and time.monotonic() - _flushed_at > config.METRICS_FLUSH_SECONDS:
+        flush()
+
+@contextmanager
+def request_context(endpoint: str, facilities_type: List[str]) -> Iterator[None]:
+    """
+    요청 하나의 label을 정하고 전체 소요시간을 'total' 단계로 기록
+    """
+    if not config.METRICS_ENABLED:
+        yield
+        return
+
+    token = _labels.set((endpoint, str(len(set(facilities_type).intersection(FACILITY_TYPES)))))
+    try:
+        with _Timer('total'):
+            yield
+    finally:
+        _labels.reset(token)
+
+def register_gauge(name: str, callback: Callable[[], Dict]) -> None:
+    _gauges[name] = callback
+
+
+# uWSGI worker 간 합산
+## METRICS_DIR이 설정되면 worker마다 주기적으로 {pid}.json에 snapshot을 쓰고, /metrics는 전체 파일을 합산함
+## - 종료된 worker(pid 없음)나 오래 갱신되지 않은 파일은 삭제해서 gauge가 남거나 재시작 후 counter가 중복되지 않도록 함
+def _snapshot() -> Dict:
+    gauges = {}
+    for name, callback in _gauges.items():
+        try:
+            gauges[name] = {stat: value for stat, value in callback().items()
+                            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        except Exception:
+            gauges[name] = {}
+
+    return {'histograms': histograms.snapshot(), 'gauges': gauges}
+
+def flush() -> None:
+    global _flushed_at
+
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _flushed_at = time.monotonic()
+        atomic_write_json(os.path.join(config.METRICS_DIR, f"{os.getpid()}.json"), _snapshot())
+    finally:
+        _flush_lock.release()
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 다른 사용자의 process - 살아 있음
+        return True
+    return True
+
+def _is_stale_snapshot(path: str) -> bool:
+    try:
+        pid = int(os.path.basename(path)[:-len('.json')])
+        age = time.time() - os.stat(path).st_mtime
+    except (ValueError, OSError):
+        return False
+
+    if pid == os.getpid():
+        return False
+    return not _pid_alive(pid) or age > config.METRICS_STALE_FLUSHES * config.METRICS_FLUSH_SECONDS
+
+def _merged_snapshot() -> Dict:
+    if not config.METRICS_DIR:
+        return _snapshot()
+
+    flush()
+    merged = {'histograms': {}, 'gauges': {}}
+    for path in glob.glob(os.path.join(config.METRICS_DIR, '*.json')):
+        if _is_stale_snapshot(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for key, values in snapshot['histograms'].items():
+            total = merged['histograms'].setdefault(key, [0] * len(values))
+            merged['histograms'][key] = [a + b for a, b in zip(total, values)]
+        for name, stats in snapshot['gauges'].items():
+            total = merged['gauges'].setdefault(name, {})
+            for stat, value in stats.items():
+                total[stat] = total.get(stat, 0) + value
+
+    return merged
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def render_prometheus() -> str:
+    """
+    Prometheus text format (version 0.0.4)
+    """
+    snapshot = _merged_snapshot()
+    lines = ['# HELP mappy_stage_seconds Time spent per request stage',
+             '# TYPE mappy_stage_seconds histogram']
+
+    for key in sorted(snapshot['histograms']):
+        values = snapshot['histograms'][key]
+        endpoint, facility_count, stage = key.split('|')
+        labels = f'endpoint="{_escape(endpoint)}",facility_count="{_escape(facility_count)}",stage="{_escape(stage)}"'
+
+        cumulative = 0
+        for bucket, count in zip(DEFAULT_BUCKETS, values):
+            cumulative += count
+            lines.append(f'mappy_stage_seconds_bucket{{{labels},le="{bucket}"}} {cumulative}')
+        cumulative += values[len(DEFAULT_BUCKETS)]
+        lines.append(f'mappy_stage_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f'mappy_stage_seconds_sum{{{labels}}} {values[-1]}')
+        lines.append(f'mappy_stage_seconds_count{{{labels}}} {cumulative}')
+
+    for name in sorted(snapshot['gauges']):
+        lines.append(f'# TYPE {name} gauge')
+        for stat, value in sorted(snapshot['gauges'][name].items()):
+            lines.append(f'{name}{{stat="{_escape(stat)}"}} {value}')
+
+    return '\n'.join(lines) + '\n'
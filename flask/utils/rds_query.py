@@ -0,0 +1,436 @@
+import os
+import threading
+import mysql.connector
+from functools import lru_cache
+from typing import List, Dict, Tuple
+
+from utils.admission import AdmissionController, OverloadedError, remaining_seconds
+from utils.circuit_breaker import CircuitBreaker
+from utils.db_connector import DBManagement, DBConnectionPool, PoolTimeoutError, ReplicaRouter
+from utils.facilities import FACILITY_CATEGORY_CODES, FACILITY_TYPES, HASHTAG_KEYWORDS, check_facilities, facility_columns
+from utils.grid_aggregate import GRID_COUNT_TABLE, category_cell_runs, classify_cells
+from utils.unified_facility import UNIFIED_TABLE
+from utils.spatial_engine import bounding_box
+from utils import config, metrics
+
+# worker process 당 하나의 connection pool
+## db_info.txt에 replica_hosts가 있으면 읽기 query는 read replica로 보냄 (ReplicaRouter)
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool, _pool_pid
+
+    # uWSGI가 master에서 app을 load한 뒤 fork하면 socket이 공유되므로 pid가 바뀌면 새로 생성
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            db_info_dict = DBManagement.get_db_info(config.DB_INFO_PATH)
+            pool_options = {
+                            'min_size': config.DB_POOL_MIN_SIZE,
+                            'max_size': config.DB_POOL_MAX_SIZE,
+                            'idle_timeout': config.DB_POOL_IDLE_TIMEOUT,
+                            'wait_timeout': config.DB_POOL_WAIT_TIMEOUT,
+                            }
+
+            if config.READ_REPLICA_ENABLED and DBManagement.get_replica_db_infos(db_info_dict):
+                _pool = ReplicaRouter(db_info_dict, pool_options,
+                                      max_lag=config.REPLICA_MAX_LAG_SECONDS,
+                                      lag_check_interval=config.REPLICA_LAG_CHECK_SECONDS,
+                                      retry_interval=config.REPLICA_RETRY_SECONDS,
+                                      connect_timeout=config.REPLICA_CONNECT_TIMEOUT)
+            else:
+                _pool = DBConnectionPool(db_info_dict, **pool_options)
+            _pool_pid = pid
+            print(f'MySQL {db_info_dict["database"]} connection pool 생성 완료 (pid={pid})')
+
+    return _pool
+
+def pool_stats() -> Dict:
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.stats()
+
+# endpoint(primary, replica)별 상태 - replica가 없으면 primary만
+def pool_endpoint_stats() -> Dict:
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    if isinstance(_pool, ReplicaRouter):
+        return _pool.endpoint_stats()
+    return {'primary': _pool.stats()}
+
+
+# Query template
+## 좌표, 반경은 모두 parameter(%s)로 넘기고, template은 업종 조합별로 한번만 만들어서
+## connection마다 server-side prepared statement로 재사용함
+## - 업종(table) 이름은 FACILITY_TYPES whitelist에 있는 것만 template에 들어감
+
+# 반경을 감싸는 위경도 사각형(MBR)으로 spatial index를 타고, 그 안에서만 정확한 구면 거리 계산
+## params: radius_where_params()
+RADIUS_WHERE_TEMPLATE = "MBRContains(ST_GeomFromText(%s, 4326), coordinates) AND ST_Distance_Sphere(ST_GeomFromText(%s, 4326), coordinates) < %s"
+
+# SRID 4326은 (lat lon) 축 순서
+def point_wkt(lat: float, lon: float) -> str:
+    return f"POINT({float(lat)!r} {float(lon)!r})"
+
+def envelope_wkt(lat: float, lon: float, radius_meter: float) -> str:
+    # 경계의 부동소수점 오차로 점이 빠지지 않도록 1m 여유
+    min_lat, min_lon, max_lat, max_lon = bounding_box(lat, lon, radius_meter + 1)
+    corners = [(min_lat, min_lon), (max_lat, min_lon), (max_lat, max_lon), (min_lat, max_lon), (min_lat, min_lon)]
+
+    return "POLYGON((" + ", ".join(f"{corner_lat:.7f} {corner_lon:.7f}" for corner_lat, corner_lon in corners) + "))"
+
+# 사각형 (min_lat, min_lon, max_lat, max_lon)
+def box_wkt(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> str:
+    corners = [(min_lat, min_lon), (max_lat, min_lon), (max_lat, max_lon), (min_lat, max_lon), (min_lat, min_lon)]
+    return "POLYGON((" + ", ".join(f"{float(corner_lat)!r} {float(corner_lon)!r}" for corner_lat, corner_lon in corners) + "))"
+
+def radius_where_params(lat: float, lon: float, radius_meter: float) -> list:
+    return [envelope_wkt(lat, lon, radius_meter), point_wkt(lat, lon), radius_meter]
+
+# 한 업종 table에 대한 반경 검색 subquery - params: radius_subquery_params()
+def radius_subquery(facility: str, extra_select: str = '') -> str:
+    name_column, address_column = facility_columns(facility)
+    radius_query = f"""
+        SELECT {extra_select}{name_column} AS Name, '{facility}' AS Kind, ST_Distance_Sphere(ST_GeomFromText(%s, 4326), coordinates) AS distance, {address_column} AS address, lat, lon
+        FROM {facility}
+        WHERE {RADIUS_WHERE_TEMPLATE}
+        """
+
+    return radius_query
+
+def radius_subquery_params(lat: float, lon: float, radius_meter: float) -> list:
+    return [point_wkt(lat, lon)] + radius_where_params(lat, lon, radius_meter)
+
+# 위치 point_count개 x 업종들 - 위치가 여러 개면 각 row 앞에 위치 번호(point_index)를 붙임
+@lru_cache(maxsize=256)
+def rows_query_template(facilities: Tuple[str, ...], point_count: int = 1) -> str:
+    check_facilities(facilities)
+
+    if point_count == 1:
+        radius_query_list = [radius_subquery(facility) for facility in facilities]
+        return " UNION ALL".join(radius_query_list) + "ORDER BY distance;"
+
+    radius_query_list = [radius_subquery(facility, extra_select=f"{point_index} AS point_index, ")
+                         for point_index in range(point_count)
+                         for facility in facilities]
+    return " UNION ALL".join(radius_query_list) + "ORDER BY point_index, distance;"
+
+# 업종별 개수, 키워드 개수 (top_k면 가까운 k개 장소까지) - k는 LIMIT parameter
+@lru_cache(maxsize=256)
+def summary_query_template(facilities: Tuple[str, ...], top_k: bool) -> str:
+    check_facilities(facilities)
+
+    radius_query_list = []
+    for facility in facilities:
+        name_column, address_column = facility_columns(facility)
+        keyword = HASHTAG_KEYWORDS.get(facility)
+        keyword_query = f"REGEXP_LIKE({name_column}, '{keyword}', 'c')" if keyword else "0"
+
+        if top_k:
+            # window 함수는 LIMIT 전에 계산되므로 반경 안 전체 개수를 함께 얻음
+            radius_query = f"""
+            (SELECT {name_column} AS Name, '{facility}' AS Kind, ST_Distance_Sphere(ST_GeomFromText(%s, 4326), coordinates) AS distance, {address_column} AS address, lat, lon,
+                    COUNT(*) OVER () AS kind_count, SUM({keyword_query}) OVER () AS keyword_count
+            FROM {facility}
+            WHERE {RADIUS_WHERE_TEMPLATE}
+            ORDER BY distance
+            LIMIT %s)
+            """
+        else:
+            radius_query = f"""
+            SELECT NULL AS Name, '{facility}' AS Kind, NULL AS distance, NULL AS address, NULL AS lat, NULL AS lon,
+                   COUNT(*) AS kind_count, COALESCE(SUM({keyword_query}), 0) AS keyword_count
+            FROM {facility}
+            WHERE {RADIUS_WHERE_TEMPLATE}
+            """
+        radius_query_list.append(radius_query)
+
+    radius_query = " UNION ALL".join(radius_query_list)
+    if top_k:
+        radius_query += "ORDER BY distance"
+
+    return radius_query + ";"
+
+
+# 통합 facility table template (config.UNIFIED_FACILITY_TABLE)
+## 업종 조합과 관계없이 spatial index 한번만 읽고 category로 거름 - 결과 row 형태는 업종별 table template과 같음
+UNIFIED_KIND_COLUMN = "ELT(category + 1, " + ", ".join(f"'{facility}'" for facility, _ in sorted(FACILITY_CATEGORY_CODES.items(), key=lambda item: item[1])) + ")"
+
+def unified_category_filter(facilities: Tuple[str, ...]) -> str:
+    return f"category IN ({', '.join(str(FACILITY_CATEGORY_CODES[facility]) for facility in facilities)})"
+
+def unified_keyword_column(facilities: Tuple[str, ...]) -> str:
+    cases = [f"WHEN {FACILITY_CATEGORY_CODES[facility]} THEN REGEXP_LIKE(name, '{HASHTAG_KEYWORDS[facility]}', 'c')"
+             for facility in facilities if facility in HASHTAG_KEYWORDS]
+    return f"CASE category {' '.join(cases)} ELSE 0 END" if cases else "0"
+
+# params: 위치마다 radius_subquery_params()
+@lru_cache(maxsize=256)
+def unified_rows_query_template(facilities: Tuple[str, ...], point_count: int = 1) -> str:
+    check_facilities(facilities)
+
+    def radius_query(extra_select: str = '') -> str:
+        return f"""
+        SELECT {extra_select}name AS Name, {UNIFIED_KIND_COLUMN} AS Kind, ST_Distance_Sphere(ST_GeomFromText(%s, 4326), coordinates) AS distance, address, lat, lon
+        FROM {UNIFIED_TABLE}
+        WHERE {unified_category_filter(facilities)} AND {RADIUS_WHERE_TEMPLATE}
+        """
+
+    if point_count == 1:
+        return radius_query() + "ORDER BY distance;"
+
+    radius_query_list = [radius_query(extra_select=f"{point_index} AS point_index, ") for point_index in range(point_count)]
+    return " UNION ALL".join(radius_query_list) + "ORDER BY point_index, distance;"
+
+# params: top_k면 radius_subquery_params() + [k], 아니면 radius_where_params()
+@lru_cache(maxsize=256)
+def unified_summary_query_template(facilities: Tuple[str, ...], top_k: bool) -> str:
+    check_facilities(facilities)
+
+    if not top_k:
+        return f"""
+        SELECT NULL AS Name, {UNIFIED_KIND_COLUMN} AS Kind, NULL AS distance, NULL AS address, NULL AS lat, NULL AS lon,
+               COUNT(*) AS kind_count, COALESCE(SUM({unified_keyword_column(facilities)}), 0) AS keyword_count
+        FROM {UNIFIED_TABLE}
+        WHERE {unified_category_filter(facilities)} AND {RADIUS_WHERE_TEMPLATE}
+        GROUP BY category;
+        """
+
+    # 업종별 거리 순위로 k개까지 자르고, 반경 안 전체 개수는 window 함수로 함께 얻음
+    return f"""
+        SELECT Name, Kind, distance, address, lat, lon, kind_count, keyword_count
+        FROM (
+            SELECT candidate.*,
+                   ROW_NUMBER() OVER (PARTITION BY category ORDER BY distance) AS kind_rank,
+                   COUNT(*) OVER (PARTITION BY category) AS kind_count,
+                   SUM(keyword) OVER (PARTITION BY category) AS keyword_count
+            FROM (
+                SELECT category, name AS Name, {UNIFIED_KIND_COLUMN} AS Kind, ST_Distance_Sphere(ST_GeomFromText(%s, 4326), coordinates) AS distance, address, lat, lon,
+                       {unified_keyword_column(facilities)} AS keyword
+                FROM {UNIFIED_TABLE}
+                WHERE {unified_category_filter(facilities)} AND {RADIUS_WHERE_TEMPLATE}
+            ) AS candidate
+        ) AS ranked
+        WHERE kind_rank <= %s
+        ORDER BY distance;
+        """
+
+
+# 사각형(viewport) 안의 시설을 (category, id) 순으로 keyset pagination
+## UNIFIED_FACILITY_TABLE 설정과 관계없이 항상 통합 table 사용 (갱신 script가 설정과 관계없이 통합 table을 채움)
+## params: [사각형 POLYGON, 이전 page 마지막 category, 마지막 id, limit]
+@lru_cache(maxsize=256)
+def viewport_query_template(facilities: Tuple[str, ...]) -> str:
+    check_facilities(facilities)
+
+    return f"""
+        SELECT category, id, name, address, lat, lon
+        FROM {UNIFIED_TABLE}
+        WHERE {unified_category_filter(facilities)} AND MBRContains(ST_GeomFromText(%s, 4326), coordinates)
+          AND (category, id) > (%s, %s)
+        ORDER BY category, id
+        LIMIT %s;
+        """
+
+
+# 격자 집계 count template (config.GRID_COUNT_ENABLED)
+## 완전히 안에 있는 cell은 집계 table 합, 경계 cell은 통합 table의 row를 거리 계산 - 업종 조합은 JSON parameter로 넘기므로 template 하나
+## params: [완전히 안 cell JSON, 경계 cell JSON, 중심 POINT, 반경] (JSON은 grid_aggregate.category_cell_runs)
+CELL_RUNS_TABLE = "JSON_TABLE(%s, '$[*]' COLUMNS (kind_code INT PATH '$[0]', row_no INT PATH '$[1]', col_from INT PATH '$[2]', col_to INT PATH '$[3]')) AS cells"
+
+@lru_cache(maxsize=1)
+def grid_count_query_template() -> str:
+    return f"""
+        SELECT grid.category, SUM(grid.count) AS kind_count, SUM(grid.keyword_count) AS keyword_count
+        FROM {CELL_RUNS_TABLE}
+        JOIN {GRID_COUNT_TABLE} AS grid
+          ON grid.category = cells.kind_code AND grid.cell_row = cells.row_no AND grid.cell_col BETWEEN cells.col_from AND cells.col_to
+        GROUP BY grid.category
+        UNION ALL
+        SELECT category, COUNT(*) AS kind_count, COALESCE(SUM({unified_keyword_column(tuple(FACILITY_CATEGORY_CODES))}), 0) AS keyword_count
+        FROM {CELL_RUNS_TABLE}
+        JOIN {UNIFIED_TABLE}
+          ON category = cells.kind_code AND cell_row = cells.row_no AND cell_col BETWEEN cells.col_from AND cells.col_to
+        WHERE ST_Distance_Sphere(ST_GeomFromText(%s, 4326), coordinates) < %s
+        GROUP BY category;
+        """
+
+
+# Admission control
+## worker process 안의 thread들이 동시에 실행하는 DB query 개수를 제한하고, 넘치면 기다리지 않고 503 (OverloadedError)
+admission = AdmissionController(max_in_flight=config.ADMISSION_MAX_IN_FLIGHT, max_queue=config.ADMISSION_MAX_QUEUE)
+
+def admission_stats() -> Dict:
+    return admission.stats()
+
+class QueryTimeoutError(OverloadedError):
+    """
+    MAX_EXECUTION_TIME 안에 끝나지 않아 MySQL이 중단한 query
+    """
+    pass
+
+# MySQL ER_QUERY_TIMEOUT (MAX_EXECUTION_TIME 초과로 중단됨)
+QUERY_TIMEOUT_ERRNO = 3024
+
+class UnifiedTableMissingError(Exception):
+    """
+    통합 facility table이 아직 없음 (갱신 script를 한번도 실행하지 않은 DB)
+    """
+    pass
+
+# MySQL ER_NO_SUCH_TABLE
+NO_SUCH_TABLE_ERRNO = 1146
+
+# DB 접속/응답 장애 에러 - circuit breaker는 이 에러만 실패로 셈
+## ProgrammingError(table 없음, SQL 오류 등)는 장애가 아니므로 그대로 500
+DB_FAILURE_ERRORS = (mysql.connector.OperationalError, mysql.connector.InterfaceError, PoolTimeoutError, QueryTimeoutError)
+
+# DB를 사용할 수 없을 때 나는 에러 (이 경우에만 stale 결과로 대체)
+## OverloadedError: admission 거절, QueryTimeoutError, CircuitOpenError
+DB_UNAVAILABLE_ERRORS = (OverloadedError, PoolTimeoutError, mysql.connector.OperationalError, mysql.connector.InterfaceError)
+
+# Circuit breaker
+## DB 장애 에러나 느린 query가 연속되면 잠시 query를 보내지 않음 (호출한 쪽은 stale 결과로 대체)
+breaker = CircuitBreaker(failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+                         reset_timeout=config.BREAKER_RESET_SECONDS,
+                         slow_call_seconds=config.BREAKER_SLOW_CALL_SECONDS,
+                         failure_errors=DB_FAILURE_ERRORS)
+
+def breaker_stats() -> Dict:
+    return breaker.stats()
+
+# 첫 SELECT에 붙인 hint가 UNION ALL 전체 statement에 적용됨
+@lru_cache(maxsize=512)
+def with_execution_time_hint(query: str, milliseconds: int) -> str:
+    if milliseconds <= 0:
+        return query
+    return query.replace("SELECT", f"SELECT /*+ MAX_EXECUTION_TIME({milliseconds}) */", 1)
+
+# execute (실행 차례를 받은 뒤 pool에서 connection을 빌려서 prepared statement 실행 후 반납)
+def execute_prepared(statement_key: Tuple, query: str, params: list) -> List[Tuple]:
+    if config.ADMISSION_MAX_IN_FLIGHT <= 0:
+        with breaker.call():
+            return _execute_prepared(statement_key, query, params)
+
+    # 요청 deadline이 있으면 남은 시간까지만 대기
+    remaining = remaining_seconds()
+    timeout = config.ADMISSION_QUEUE_TIMEOUT if remaining is None else min(remaining, config.ADMISSION_QUEUE_TIMEOUT)
+    if timeout <= 0:
+        admission.reject_deadline()
+        raise OverloadedError("요청 deadline이 지났습니다")
+
+    with metrics.timer('admission_wait'):
+        admission.acquire(timeout)
+    try:
+        with breaker.call():
+            return _execute_prepared(statement_key, query, params)
+    finally:
+        admission.release()
+
+def _execute_prepared(statement_key: Tuple, query: str, params: list) -> List[Tuple]:
+    query = with_execution_time_hint(query, config.DB_MAX_EXECUTION_MS)
+
+    pool = get_pool()
+    with metrics.timer('db_connect'):
+        dbm = pool.acquire()
+
+    try:
+        with metrics.timer('sql'):
+            query_result = dbm.execute_prepared(statement_key, query, params, max_statements=config.PREPARED_STATEMENT_CACHE_SIZE)
+    except Exception as e:
+        # query 도중 에러가 난 connection은 상태를 알 수 없으므로 버림
+        pool.release(dbm, discard=True)
+        if getattr(e, 'errno', None) == QUERY_TIMEOUT_ERRNO:
+            raise QueryTimeoutError(f"DB query가 {config.DB_MAX_EXECUTION_MS}ms 안에 끝나지 않았습니다") from e
+        raise
+
+    pool.release(dbm)
+    return query_result
+
+# row: (name, kind, distance, address, lat, lon) - 거리순 정렬
+## 업종별 table이면 업종마다 subquery가 하나씩이라 parameter도 업종 개수만큼 반복
+def query_rds_rows(facilities_type: List[str], lat: float, lon: float, radius_meter: float) -> List[Tuple]:
+    return query_rds_rows_multi(facilities_type, [(lat, lon, radius_meter)])[0]
+
+# 여러 위치를 query 한번으로 검색 - 각 row에 위치 번호(point_index)를 붙여서 나눔
+def query_rds_rows_multi(facilities_type: List[str], queries: List[Tuple[float, float, float]]) -> List[List[Tuple]]:
+    facilities = tuple(facilities_type)
+    if config.UNIFIED_FACILITY_TABLE:
+        statement_key, query, repeat = ('unified_rows', facilities, len(queries)), unified_rows_query_template(facilities, len(queries)), 1
+    else:
+        statement_key, query, repeat = ('rows', facilities, len(queries)), rows_query_template(facilities, len(queries)), len(facilities)
+
+    params = [param for lat, lon, radius_meter in queries
+              for param in radius_subquery_params(lat, lon, radius_meter) * repeat]
+
+    query_result = execute_prepared(statement_key, query, params)
+    if len(queries) == 1:
+        return [query_result]
+
+    rows_list = [[] for _ in queries]
+    for row in query_result:
+        rows_list[row[0]].append(row[1:])
+
+    return rows_list
+
+# DB에서 업종별 개수, 키워드 개수, 가까운 k개 장소까지 계산 (k=0이면 개수만)
+def query_rds_summary(facilities_type: List[str], lat: float, lon: float, radius_meter: float,
+                      k: int = 0) -> Tuple[Dict[str, Tuple[int, int]], List[Tuple]]:
+    facilities = tuple(facilities_type)
+    if config.UNIFIED_FACILITY_TABLE:
+        statement_key, query, repeat = ('unified_summary', facilities, k > 0), unified_summary_query_template(facilities, k > 0), 1
+    else:
+        statement_key, query, repeat = ('summary', facilities, k > 0), summary_query_template(facilities, k > 0), len(facilities)
+
+    if k > 0:
+        params = (radius_subquery_params(lat, lon, radius_meter) + [k]) * repeat
+    else:
+        params = radius_where_params(lat, lon, radius_meter) * repeat
+
+    query_result = execute_prepared(statement_key, query, params)
+
+    summary = {facility: (0, 0) for facility in facilities_type}
+    places = []
+    for row in query_result:
+        summary[row[1]] = (int(row[6]), int(row[7] or 0))
+        if k > 0:
+            places.append(row[:6])
+
+    return summary, places
+
+# 격자 집계로 업종별 개수, 키워드 개수 계산 - 반경이 커져도 읽는 row는 경계 cell의 row뿐
+def query_grid_counts(facilities_type: List[str], lat: float, lon: float, radius_meter: float) -> Dict[str, Tuple[int, int]]:
+    facilities = tuple(facilities_type)
+    check_facilities(facilities)
+
+    full_runs, boundary_runs = classify_cells(lat, lon, radius_meter)
+    params = [category_cell_runs(facilities, full_runs), category_cell_runs(facilities, boundary_runs),
+              point_wkt(lat, lon), radius_meter]
+
+    query_result = execute_prepared(('grid_counts',), grid_count_query_template(), params)
+
+    summary = {facility: (0, 0) for facility in facilities_type}
+    for category, kind_count, keyword_count in query_result:
+        facility = FACILITY_TYPES[int(category)]
+        count, keyword = summary[facility]
+        summary[facility] = (count + int(kind_count), keyword + int(keyword_count or 0))
+
+    return summary
+
+# row: (category, id, name, address, lat, lon) - after: 이전 page 마지막 (category, id), 처음이면 (-1, -1)
+def query_rds_viewport(facilities_type: List[str], box: Tuple[float, float, float, float],
+                       after: Tuple[int, int], limit: int) -> List[Tuple]:
+    facilities = tuple(sorted(facilities_type))
+    params = [box_wkt(*box), after[0], after[1], limit]
+
+    try:
+        return execute_prepared(('viewport', facilities), viewport_query_template(facilities), params)
+    except mysql.connector.ProgrammingError as e:
+        if e.errno == NO_SUCH_TABLE_ERRNO:
+            raise UnifiedTableMissingError(f"통합 table({UNIFIED_TABLE})이 없습니다. 갱신 script를 먼저 실행해야 합니다.") from e
+        raise
@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from utils.file_watch import FileWatcher, atomic_write_json
+from utils import config
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 7) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash = []
+    bit, ch, even = 0, 0, True
+
+    while len(geohash) < precision:
+        # 짝수 번째 bit는 경도, 홀수 번째 bit는 위도
+        target, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (target[0] + target[1]) / 2
+        if value >= mid:
+            ch |= 1 << (4 - bit)
+            target[0] = mid
+        else:
+            target[1] = mid
+        even = not even
+
+        if bit < 4:
+            bit += 1
+        else:
+            geohash.append(_BASE32[ch])
+            bit, ch = 0, 0
+
+    return ''.join(geohash)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """
+    geohash cell의 (min_lat, min_lon, max_lat, max_lon)
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+
+    for c in geohash:
+        ch = _BASE32.index(c)
+        for bit in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if ch >> bit & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache (thread-safe)
+    - key의 첫 번째 값은 업종 tuple로, 업종 단위 invalidate에 사용
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # key -> (저장 시각, value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._stats = {
+                    'hits': 0,
+                    'misses': 0,
+                    'expired': 0,
+                    'evictions': 0,
+                    'invalidations': 0,
+                    }
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            stored_at, value = entry
+            if now - stored_at > self.ttl:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, categories: Optional[Iterable[str]] = None) -> int:
+        """
+        categories가 포함된 entry 삭제 (None이면 전체 삭제)
+        """
+        with self._lock:
+            if categories is None:
+                removed = list(self._entries)
+            else:
+                categories = set(categories)
+                removed = [key for key in self._entries if categories.intersection(key[0])]
+
+            for key in removed:
+                del self._entries[key]
+            self._stats['invalidations'] += len(removed)
+
+        return len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['ttl'] = self.ttl
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Invalidation marker
+## 갱신 script와 uWSGI worker는 다른 process이므로, script가 파일에 업종별 갱신 시각을 기록하면
+## worker가 주기적으로 확인해서 해당 업종의 cache를 비움
+def mark_invalidated(categories: Optional[List[str]] = None, path: str = None) -> None:
+    """
+    갱신 script에서 호출 - categories가 None이면 전체 업종
+    """
+    path = path or config.CACHE_INVALIDATION_PATH
+
+    marker = read_marker(path)
+    now = time.time()
+    for category in (categories if categories is not None else ['*']):
+        marker[category] = now
+
+    atomic_write_json(path, marker)
+
+def read_marker(path: str) -> Dict[str, float]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+class InvalidationWatcher:
+    """
+    worker에서 marker 파일을 check_interval 마다 확인해서 cache에 반영
+    """
+
+    def __init__(self, cache: ResponseCache, path: str, check_interval: float = 5.0) -> None:
+        self.cache = cache
+        self._marker = FileWatcher(path, read_marker, check_interval)
+        # app 시작 전에 기록된 marker는 무시 (cache가 비어 있음)
+        self._seen = self._marker.get() or {}
+
+    def check(self) -> None:
+        marker = self._marker.get()
+        if marker is None or marker is self._seen:
+            return
+
+        changed = [category for category, updated_at in marker.items()
+                   if updated_at > self._seen.get(category, 0)]
+        self._seen = marker
+
+        if '*' in changed:
+            self.cache.invalidate()
+        elif changed:
+            self.cache.invalidate(changed)
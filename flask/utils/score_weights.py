@@ -0,0 +1,123 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.db_connector import DBManagement
+from utils.facilities import FACILITY_TYPES
+from utils.file_watch import FileWatcher, atomic_write_json
+from utils import config
+
+# 가중치로 활용하기 위한 각 업종별 전체 데이터 개수 - snapshot 파일이 없을 때 사용하는 기본값
+DEFAULT_SCORE_WEIGHT = {
+            'bus': 200000,
+            'cafe': 51000,
+            'convenience': 52000,
+            'gym': 35000,
+            'hair': 180000,
+            'hospital': 70000,
+            'mart':2700,
+            'laundry': 20000,
+            'pharmacy': 24000
+            }
+
+# score 계산 대상 업종 (지하철은 제외)
+SCORE_FACILITY_TYPES = [facility for facility in FACILITY_TYPES if facility != 'metro']
+
+
+class ScoreWeights:
+    """
+    업종별 전체 데이터 개수 snapshot (version 단위로 교체되고, 만들어진 뒤에는 바뀌지 않음)
+    """
+
+    def __init__(self, weights: Dict[str, int], version: int = 0, updated_at: float = 0.0) -> None:
+        self.weights = dict(weights)
+        self.version = version
+        self.updated_at = updated_at
+
+        self._total = sum(self.weights.values())
+        # 정렬한 업종 조합 -> 업종별 보정 배율 sum(weight) / weight (요청마다 업종 순서가 달라도 같은 entry 사용)
+        self._ratios = {}
+
+    def ratio(self, score_types: Tuple[str, ...]) -> np.ndarray:
+        key = tuple(sorted(score_types))
+        ratios = self._ratios.get(key)
+        if ratios is None:
+            # 데이터가 0개인 업종은 1개로 보고 계산 (0으로 나누지 않도록)
+            ratios = {facility: self._total / max(self.weights[facility], 1) for facility in key}
+            self._ratios[key] = ratios
+
+        return np.array([ratios[facility] for facility in score_types], dtype=np.float64)
+
+    def to_dict(self) -> Dict:
+        return {'version': self.version, 'updated_at': self.updated_at, 'weights': self.weights}
+
+
+# Snapshot 파일
+## 갱신 script가 적재 후 한번 table 크기를 세어서 version을 올려 저장하고, worker는 파일이 바뀌면 다시 읽음
+## facilities_type: 이번에 적재한 table들 (None이면 전체 업종 - 모든 table이 있어야 함)
+def compute_score_weights(dbm: DBManagement, facilities_type: List[str] = None) -> Dict[str, int]:
+    if facilities_type is None:
+        facilities_type = SCORE_FACILITY_TYPES
+    return {facility: dbm.table_size(facility) for facility in facilities_type if facility in SCORE_FACILITY_TYPES}
+
+def read_score_weights(path: str = None) -> Optional[ScoreWeights]:
+    path = path or config.SCORE_WEIGHT_PATH
+
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    # snapshot에 없는 업종은 기본값 사용
+    weights = dict(DEFAULT_SCORE_WEIGHT)
+    weights.update({facility: int(count) for facility, count in snapshot['weights'].items() if facility in weights})
+
+    return ScoreWeights(weights, version=int(snapshot['version']), updated_at=float(snapshot['updated_at']))
+
+def save_score_weights(weights: Dict[str, int], path: str = None) -> ScoreWeights:
+    path = path or config.SCORE_WEIGHT_PATH
+
+    previous = read_score_weights(path)
+    merged = dict(previous.weights) if previous is not None else dict(DEFAULT_SCORE_WEIGHT)
+    merged.update(weights)
+
+    snapshot = ScoreWeights(merged, version=(previous.version if previous is not None else 0) + 1, updated_at=time.time())
+    atomic_write_json(path, snapshot.to_dict())
+
+    return snapshot
+
+def update_score_weights(dbm: DBManagement, facilities_type: List[str] = None, path: str = None) -> ScoreWeights:
+    """
+    갱신 script에서 적재가 끝난 뒤 호출
+    """
+    return save_score_weights(compute_score_weights(dbm, facilities_type), path)
+
+
+# worker에서 사용하는 현재 snapshot (파일이 없으면 기본값)
+_watcher = FileWatcher(config.SCORE_WEIGHT_PATH, read_score_weights, config.SCORE_WEIGHT_CHECK_SECONDS,
+                       default=ScoreWeights(DEFAULT_SCORE_WEIGHT))
+
+def current_score_weights() -> ScoreWeights:
+    """
+    SCORE_WEIGHT_CHECK_SECONDS 마다 파일이 바뀌었는지 확인해서 새 snapshot으로 교체
+    """
+    return _watcher.get()
+
+def score_matrix(score_types: Tuple[str, ...], cnt_matrix: np.ndarray, total_count: np.ndarray) -> np.ndarray:
+    """
+    업종별 개수 행렬 (위치 개수, 업종 개수)과 위치별 전체 개수 (위치 개수, 1) -> 업종별 score (소수 첫째자리까지 반올림)
+    """
+    weight_ratio = current_score_weights().ratio(score_types)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 전체 중 비율 고려한 수치 (30%)
+        rate_matrix = (cnt_matrix / total_count * 100) * 0.3
+
+        # 가중치 고려한 보정 개수 수치 (70%)
+        weighted_cnt_matrix = (cnt_matrix * weight_ratio) * 0.7
+        weighted_cnt_matrix = np.where(weighted_cnt_matrix > 1, np.log(weighted_cnt_matrix) / np.log(2), 0)
+
+    return np.round(rate_matrix + weighted_cnt_matrix, 1)
@@ -0,0 +1,308 @@
+import numpy as np
+import threading
+import time
+from typing import List, Dict, Tuple, Optional
+
+from utils.db_connector import DBManagement
+from utils.facilities import FACILITY_CATEGORY_CODES, FACILITY_TYPES, facility_columns
+from utils.facility_snapshot import FacilitySnapshot, write_facility_snapshot
+from utils.file_watch import FileWatcher
+from utils import config
+
+# MySQL ST_Distance_Sphere 기본 지구 반지름(m) - RDS 결과와 같은 거리값을 내기 위함
+EARTH_RADIUS_METER = 6370986.0
+METER_PER_DEGREE = EARTH_RADIUS_METER * np.pi / 180
+
+
+def haversine_meter(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    한 점(lat, lon)과 여러 점(lats, lons) 사이의 구면 거리(m)
+    """
+    lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+    lats_rad, lons_rad = np.radians(lats), np.radians(lons)
+
+    a = np.sin((lats_rad - lat_rad) / 2) ** 2 \
+        + np.cos(lat_rad) * np.cos(lats_rad) * np.sin((lons_rad - lon_rad) / 2) ** 2
+    return 2 * EARTH_RADIUS_METER * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_meter: float) -> Tuple[float, float, float, float]:
+    """
+    반경 radius_meter 원을 감싸는 (min_lat, min_lon, max_lat, max_lon)
+    """
+    dlat = radius_meter / METER_PER_DEGREE
+    # 원의 위/아래 끝 중 극에 더 가까운 위도 기준으로 경도 폭 계산
+    max_abs_lat = min(abs(lat) + dlat, 89.9)
+    dlon = radius_meter / (METER_PER_DEGREE * np.cos(np.radians(max_abs_lat)))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+class GridIndex:
+    """
+    한 업종의 시설들을 위경도 격자(cell_degree) 단위로 정렬해 둔 index
+    - 같은 격자 행(row)의 cell들은 연속된 구간이므로 행마다 searchsorted 한번으로 후보를 찾음
+    """
+
+    # 격자 열(col) 번호를 key로 합치기 위한 값 (경도 360도 / 0.001도 보다 큼)
+    COL_SPAN = 1 << 20
+
+    def __init__(self, kind: str, names: List, addresses: List,
+                 lats: np.ndarray, lons: np.ndarray, cell_degree: float = 0.01) -> None:
+        self.kind = kind
+        self.cell_degree = cell_degree
+
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        keys = self._cell_key(self._cell(lats), self._cell(lons))
+        order = np.argsort(keys, kind='stable')
+
+        self.keys = keys[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.names = np.asarray(names, dtype=object)[order]
+        self.addresses = np.asarray(addresses, dtype=object)[order]
+
+    @classmethod
+    def from_sorted(cls, kind: str, keys: np.ndarray, names, addresses,
+                    lats: np.ndarray, lons: np.ndarray, cell_degree: float = 0.01) -> 'GridIndex':
+        """
+        이미 cell key 순으로 정렬된 배열(snapshot의 mmap 배열 등)을 복사 없이 그대로 사용
+        """
+        index = cls.__new__(cls)
+        index.kind = kind
+        index.cell_degree = cell_degree
+        index.keys, index.lats, index.lons = keys, lats, lons
+        index.names, index.addresses = names, addresses
+
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _cell(self, degree: np.ndarray) -> np.ndarray:
+        return np.floor(np.asarray(degree) / self.cell_degree).astype(np.int64)
+
+    def _cell_key(self, row: np.ndarray, col: np.ndarray) -> np.ndarray:
+        return row * self.COL_SPAN + (col + self.COL_SPAN // 2)
+
+    def candidates(self, lat: float, lon: float, radius_meter: float) -> np.ndarray:
+        return self.box_candidates(*bounding_box(lat, lon, radius_meter))
+
+    def box_candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """
+        사각형이 걸친 cell들의 index (오름차순)
+        """
+        rows = np.arange(self._cell(min_lat), self._cell(max_lat) + 1)
+        starts = np.searchsorted(self.keys, self._cell_key(rows, self._cell(min_lon)), side='left')
+        ends = np.searchsorted(self.keys, self._cell_key(rows, self._cell(max_lon)), side='right')
+
+        ranges = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(ranges)
+
+    def query(self, lat: float, lon: float, radius_meter: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        반경 안의 (index, distance) - ST_Distance_Sphere(...) < radius 와 같은 조건
+        """
+        idx = self.candidates(lat, lon, radius_meter)
+        distance = haversine_meter(lat, lon, self.lats[idx], self.lons[idx])
+        inside = distance < radius_meter
+        return idx[inside], distance[inside]
+
+
+    def within_box(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """
+        사각형 안의 index (오름차순) - MBRContains(사각형, coordinates) 와 같은 조건
+        """
+        idx = self.box_candidates(min_lat, min_lon, max_lat, max_lon)
+        lats, lons = self.lats[idx], self.lons[idx]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return idx[inside]
+
+
+class SpatialEngine:
+    """
+    RDS 대신 process 메모리에서 반경 검색을 수행하는 엔진
+    - query() 결과는 query_rds_rows()와 같은 (name, kind, distance, address, lat, lon) row 리스트
+    """
+
+    def __init__(self, indexes: Dict[str, GridIndex], snapshot: Optional[FacilitySnapshot] = None) -> None:
+        self.indexes = indexes
+        self.loaded_at = time.time()
+        # snapshot에서 load한 경우 mmap을 유지
+        self.snapshot = snapshot
+
+    @classmethod
+    def load_from_db(cls, dbm: DBManagement, facilities_type: List[str] = FACILITY_TYPES,
+                     cell_degree: float = 0.01, missing_ok: bool = False) -> 'SpatialEngine':
+        indexes = {}
+
+        if missing_ok:
+            dbm.cursor.execute("SHOW TABLES")
+            existing_tables = {row[0] for row in dbm.cursor.fetchall()}
+
+        for facility in facilities_type:
+            # 아직 만들어지지 않은 table은 빈 index로 둠
+            if missing_ok and facility not in existing_tables:
+                indexes[facility] = GridIndex(facility, [], [], np.empty(0), np.empty(0), cell_degree)
+                print(f"{facility} table이 없어 빈 index로 생성")
+                continue
+
+            name_column, address_column = facility_columns(facility)
+            dbm.cursor.execute(f"""
+                            SELECT {name_column}, {address_column}, lat, lon
+                            FROM {facility}
+                            """)
+            rows = dbm.cursor.fetchall()
+
+            names = [row[0] for row in rows]
+            addresses = [row[1] for row in rows]
+            lats = np.array([row[2] for row in rows], dtype=np.float64)
+            lons = np.array([row[3] for row in rows], dtype=np.float64)
+
+            indexes[facility] = GridIndex(facility, names, addresses, lats, lons, cell_degree)
+            print(f"{facility} spatial index 생성 완료 ({len(rows)}개)")
+
+        return cls(indexes)
+
+    @classmethod
+    def load_from_snapshot(cls, path: str) -> 'SpatialEngine':
+        snapshot = FacilitySnapshot(path)
+        indexes = {}
+
+        for kind in snapshot.kinds:
+            columns = snapshot.kind_columns(kind)
+            indexes[kind] = GridIndex.from_sorted(kind, columns['keys'], columns['names'], columns['addresses'],
+                                                  columns['lats'], columns['lons'], snapshot.cell_degree)
+
+        return cls(indexes, snapshot)
+
+    def export_snapshot(self, path: str) -> None:
+        cell_degree = next(iter(self.indexes.values())).cell_degree if self.indexes else config.SPATIAL_GRID_DEGREE
+        kind_columns = {kind: {'keys': index.keys,
+                               'lats': index.lats,
+                               'lons': index.lons,
+                               'names': index.names.tolist(),
+                               'addresses': index.addresses.tolist()}
+                        for kind, index in self.indexes.items()}
+
+        write_facility_snapshot(path, kind_columns, cell_degree)
+
+    def query(self, facilities_type: List[str], lat: float, lon: float, radius_meter: float) -> List[Tuple]:
+        kinds, names, distances, addresses, lats, lons = [], [], [], [], [], []
+
+        for facility in facilities_type:
+            index = self.indexes[facility]
+            idx, distance = index.query(lat, lon, radius_meter)
+
+            kinds.append(np.full(len(idx), facility, dtype=object))
+            names.append(index.names[idx])
+            addresses.append(index.addresses[idx])
+            lats.append(index.lats[idx])
+            lons.append(index.lons[idx])
+            distances.append(distance)
+
+        if not distances:
+            return []
+
+        # 전체 업종을 합쳐서 거리순 정렬 (SQL의 ORDER BY distance)
+        distances = np.concatenate(distances)
+        order = np.argsort(distances, kind='stable')
+
+        return list(zip(np.concatenate(names)[order].tolist(),
+                        np.concatenate(kinds)[order].tolist(),
+                        distances[order].tolist(),
+                        np.concatenate(addresses)[order].tolist(),
+                        np.concatenate(lats)[order].tolist(),
+                        np.concatenate(lons)[order].tolist()))
+
+    def viewport(self, facilities_type: List[str], box: Tuple[float, float, float, float],
+                 after: Tuple[int, int], limit: int) -> List[Tuple]:
+        """
+        사각형 안의 시설을 (category, index 위치) 순으로 after 다음부터 limit개
+        - row는 query_rds_viewport()와 같은 (category, key, name, address, lat, lon)
+        """
+        rows = []
+        for facility in sorted(facilities_type, key=FACILITY_CATEGORY_CODES.get):
+            category = FACILITY_CATEGORY_CODES[facility]
+            if category < after[0]:
+                continue
+
+            index = self.indexes[facility]
+            idx = index.within_box(*box)
+            if category == after[0]:
+                idx = idx[idx > after[1]]
+            idx = idx[:limit - len(rows)]
+
+            rows.extend(zip([category] * len(idx), idx.tolist(), index.names[idx].tolist(), index.addresses[idx].tolist(),
+                            index.lats[idx].tolist(), index.lons[idx].tolist()))
+            if len(rows) >= limit:
+                break
+
+        return rows
+
+
+# 갱신 script에서 적재가 끝난 뒤 호출 - 전체 업종을 snapshot 파일로 내보냄
+def export_facility_snapshot(dbm: DBManagement, path: str = None) -> None:
+    path = path or config.FACILITY_SNAPSHOT_PATH
+    engine = SpatialEngine.load_from_db(dbm, cell_degree=config.SPATIAL_GRID_DEGREE, missing_ok=True)
+    engine.export_snapshot(path)
+    print(f"facility snapshot 저장 완료: {path}")
+
+
+# worker process 당 하나의 엔진 (fork 전에 load하면 worker들이 copy-on-write로 공유)
+## snapshot 파일이 있으면 mmap으로 열어서 모든 worker가 page cache 한 벌을 공유하고, 파일이 교체되면 바로 새 파일로 교체
+## (mmap이라 load가 거의 즉시 끝나고, 참조만 바꾸므로 진행 중인 query는 이전 엔진으로 끝까지 수행됨)
+_snapshot_engine = FileWatcher(config.FACILITY_SNAPSHOT_PATH, SpatialEngine.load_from_snapshot,
+                               config.FACILITY_SNAPSHOT_CHECK_SECONDS)
+
+## snapshot 파일이 없으면 DB에서 load
+_engine: Optional[SpatialEngine] = None
+_engine_lock = threading.Lock()
+_reloading = False
+
+def load_spatial_engine() -> SpatialEngine:
+    # pool과 별개의 connection으로 load 후 바로 닫음
+    db_info_dict = DBManagement.get_db_info(config.DB_INFO_PATH)
+    dbm = DBManagement(**db_info_dict)
+    try:
+        return SpatialEngine.load_from_db(dbm, cell_degree=config.SPATIAL_GRID_DEGREE)
+    finally:
+        dbm.close()
+
+def _reload_in_background() -> None:
+    global _engine, _reloading
+
+    try:
+        engine = load_spatial_engine()
+        # 참조만 교체하므로 진행 중인 query는 이전 엔진으로 끝까지 수행됨
+        _engine = engine
+    except Exception as e:
+        # 다음 주기에 다시 시도
+        _engine.loaded_at = time.time()
+        print(f"spatial engine 갱신 실패: {e}")
+    finally:
+        _reloading = False
+
+def get_spatial_engine() -> SpatialEngine:
+    global _engine, _reloading
+
+    engine = _snapshot_engine.get()
+    if engine is not None:
+        return engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = load_spatial_engine()
+
+    # snapshot이 없으면 주기적으로 최신 데이터를 background에서 DB로부터 다시 load
+    reload_seconds = config.SPATIAL_ENGINE_RELOAD_SECONDS
+    if reload_seconds > 0 and time.time() - _engine.loaded_at > reload_seconds and not _reloading:
+        with _engine_lock:
+            if not _reloading:
+                _reloading = True
+                threading.Thread(target=_reload_in_background, daemon=True).start()
+
+    return _engine
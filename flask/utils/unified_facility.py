@@ -0,0 +1,58 @@
+from utils.db_connector import DBManagement
+from utils.facilities import FACILITY_CATEGORY_CODES, facility_columns
+
+# 전체 업종을 category column으로 구분하는 통합 table (spatial index 하나로 여러 업종 검색)
+UNIFIED_TABLE = 'facility'
+
+# 고정 격자 cell 크기 (위경도 0.001도, 약 100m) - cell_row = FLOOR(lat / CELL_DEGREE), cell_col = FLOOR(lon / CELL_DEGREE)
+## utils.grid_aggregate의 cell별 개수 table과 같은 격자를 사용
+CELL_DEGREE = 0.001
+
+
+def create_unified_table(dbm: DBManagement) -> None:
+    dbm.cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {UNIFIED_TABLE}
+                    (
+                    id INT AUTO_INCREMENT,
+                    category TINYINT UNSIGNED NOT NULL,
+                    name VARCHAR(255),
+                    address VARCHAR(512),
+                    lat DOUBLE,
+                    lon DOUBLE,
+                    coordinates POINT NOT NULL SRID 4326,
+                    cell_row INT NOT NULL,
+                    cell_col INT NOT NULL,
+                    PRIMARY KEY(id),
+                    KEY category_index (category),
+                    KEY cell_index (category, cell_row, cell_col),
+                    SPATIAL INDEX spatial_index (coordinates)
+                    );
+                    """)
+    dbm.commit()
+
+
+def sync_unified_table(dbm: DBManagement, facility: str) -> int:
+    """
+    업종별 table을 다시 적재한 뒤 호출 - 통합 table에서 해당 업종 row를 모두 바꿈 (한 transaction)
+    """
+    if facility not in FACILITY_CATEGORY_CODES:
+        print(f"{facility}는 통합 table 대상 업종이 아닙니다.")
+        return 0
+
+    create_unified_table(dbm)
+
+    category = FACILITY_CATEGORY_CODES[facility]
+    name_column, address_column = facility_columns(facility)
+
+    dbm.cursor.execute(f"DELETE FROM {UNIFIED_TABLE} WHERE category = {category}")
+    dbm.cursor.execute(f"""
+                    INSERT INTO {UNIFIED_TABLE} (category, name, address, lat, lon, coordinates, cell_row, cell_col)
+                    SELECT {category}, {name_column}, {address_column}, lat, lon, coordinates,
+                           FLOOR(lat / {CELL_DEGREE}), FLOOR(lon / {CELL_DEGREE})
+                    FROM {facility}
+                    """)
+    row_count = dbm.cursor.rowcount
+    dbm.commit()
+
+    print(f"통합 table에 {facility} {row_count}개 반영")
+    return row_count